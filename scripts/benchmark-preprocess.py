@@ -0,0 +1,207 @@
+"""Benchmark the Python station-matching and build pipeline.
+
+Runs the Bay Area stages (tokenize, index build, find, build_features) on the
+real GeoJSON inputs, the HK build in memory, and the shared metro_data
+matcher on synthetic networks of increasing size. Each stage records its best
+wall time and its peak traced allocation. Results can be saved as a JSON
+baseline and later runs compared against it:
+
+    python scripts/benchmark-preprocess.py --save
+    python scripts/benchmark-preprocess.py --check --threshold 0.25
+"""
+
+import argparse
+import importlib.util
+import json
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+from metro_data import matching
+from metro_data.index import StationIndex
+from metro_data.normalize import NORMALIZER, tokenize
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+GAME_DIR = ROOT_DIR / 'src' / 'app' / '(game)'
+BAYAREA_SCRIPT = GAME_DIR / 'bayarea' / 'data' / 'preprocess.py'
+HK_SCRIPT = GAME_DIR / 'hk' / 'data' / 'preprocess.py'
+DEFAULT_BASELINE = ROOT_DIR / '.benchmarks' / 'preprocess.json'
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+# Synthetic find/build_features work is capped so 1M-station runs finish in
+# reasonable time; the index itself is always built at full size.
+MAX_SYNTHETIC_QUERIES = 20_000
+STOPS_PER_LINE = 20
+# Stages faster than this are too noisy to flag.
+MIN_REGRESSION_SECONDS = 0.005
+
+
+def load_module(path: Path, name: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def measure(fn, repeat: int, reset=None):
+    """Return (result, best seconds, peak traced bytes) for ``fn``.
+
+    Timing runs happen without tracemalloc, which would distort them; one extra
+    traced run records peak memory.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    if reset:
+        reset()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, best, peak
+
+
+def bench_bayarea(repeat: int) -> dict:
+    pp = load_module(BAYAREA_SCRIPT, 'bayarea_preprocess')
+    reset = NORMALIZER.tokens.cache_clear
+    names = [stop['match'] for line in pp.LINES.values() for stop in line['stops']]
+    results = {}
+
+    _, seconds, peak = measure(lambda: [tokenize(name) for name in names], repeat, reset)
+    results['bayarea:tokenize'] = {'seconds': seconds, 'peak_bytes': peak, 'items': len(names)}
+
+    index, seconds, peak = measure(lambda: pp.load_index(use_cache=False), repeat, reset)
+    results['bayarea:load_index'] = {'seconds': seconds, 'peak_bytes': peak, 'items': len(index)}
+
+    _, seconds, peak = measure(lambda: [index.find(name) for name in names], repeat)
+    results['bayarea:find'] = {'seconds': seconds, 'peak_bytes': peak, 'items': len(names)}
+
+    _, seconds, peak = measure(lambda: pp.build_features(index), repeat)
+    results['bayarea:build_features'] = {'seconds': seconds, 'peak_bytes': peak, 'items': len(names)}
+    return results
+
+
+def bench_hk(repeat: int) -> dict:
+    hk = load_module(HK_SCRIPT, 'hk_preprocess')
+    outputs, seconds, peak = measure(hk.build, repeat)
+    items = outputs['features.json']['properties']['totalStations']
+    return {'hk:build': {'seconds': seconds, 'peak_bytes': peak, 'items': items}}
+
+
+def synthetic_stations(size: int, seed: int = 0):
+    rnd = random.Random(seed)
+    words = [f'{prefix}{i}' for i in range(max(size // 20, 50)) for prefix in ('oak', 'elm')]
+    suffixes = ['St', 'Ave', 'Station', 'Blvd', 'Plaza', '4th', '16th']
+    agencies = [f'Agency {i}' for i in range(8)]
+    stations = []
+    for i in range(size):
+        name = f'{rnd.choice(words)} {rnd.choice(words)} {rnd.choice(suffixes)} {i}'
+        coord = (rnd.uniform(-125.0, -66.0), rnd.uniform(24.0, 49.0))
+        stations.append((name, coord, rnd.choice(agencies)))
+    return stations
+
+
+def bench_synthetic(size: int, repeat: int) -> dict:
+    reset = NORMALIZER.tokens.cache_clear
+    stations = synthetic_stations(size)
+    rnd = random.Random(size)
+    queries = rnd.sample(stations, min(size, MAX_SYNTHETIC_QUERIES))
+    results = {}
+    prefix = f'synthetic-{size}'
+
+    _, seconds, peak = measure(lambda: [tokenize(name) for name, _, _ in stations], repeat, reset)
+    results[f'{prefix}:tokenize'] = {'seconds': seconds, 'peak_bytes': peak, 'items': size}
+
+    def build():
+        index = StationIndex()
+        for name, coord, agency in stations:
+            index.add(name, coord, agency)
+        return index
+
+    index, seconds, peak = measure(build, repeat, reset)
+    results[f'{prefix}:index_add'] = {'seconds': seconds, 'peak_bytes': peak, 'items': size}
+
+    _, seconds, peak = measure(lambda: [index.find(name, [agency]) for name, _, agency in queries], repeat)
+    results[f'{prefix}:find'] = {'seconds': seconds, 'peak_bytes': peak, 'items': len(queries)}
+
+    lines = {
+        f'Line{i}': {
+            'agency': [queries[i][2]],
+            'stops': [matching.stop(name) for name, _, _ in queries[i : i + STOPS_PER_LINE]],
+        }
+        for i in range(0, len(queries), STOPS_PER_LINE)
+    }
+    _, seconds, peak = measure(lambda: matching.build_features(index, lines), repeat)
+    results[f'{prefix}:build_features'] = {'seconds': seconds, 'peak_bytes': peak, 'items': len(queries)}
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if (
+            current['seconds'] > previous['seconds'] * (1 + threshold)
+            and current['seconds'] - previous['seconds'] > MIN_REGRESSION_SECONDS
+        ):
+            regressions.append(f"{key}: time {previous['seconds']:.4f}s -> {current['seconds']:.4f}s")
+        if current['peak_bytes'] > previous['peak_bytes'] * (1 + threshold):
+            regressions.append(
+                f"{key}: peak memory {previous['peak_bytes'] / 1e6:.1f} MB -> {current['peak_bytes'] / 1e6:.1f} MB"
+            )
+    return regressions
+
+
+def print_table(results: dict, baseline: dict) -> None:
+    print(f"{'stage':<36} {'items':>9} {'seconds':>10} {'peak MB':>9} {'vs baseline':>12}")
+    for key, row in results.items():
+        previous = baseline.get(key)
+        delta = f"{row['seconds'] / previous['seconds'] - 1:+.0%}" if previous and previous['seconds'] else ''
+        print(f"{key:<36} {row.get('items', ''):>9} {row['seconds']:>10.4f} {row['peak_bytes'] / 1e6:>9.2f} {delta:>12}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the Python preprocessors')
+    parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES, help='synthetic station counts')
+    parser.add_argument('--repeat', type=int, default=3, help='timing runs per stage; the best is kept')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help='write these results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='exit non-zero when a stage regresses')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown/growth ratio')
+    args = parser.parse_args()
+
+    results = {}
+    results.update(bench_bayarea(args.repeat))
+    results.update(bench_hk(args.repeat))
+    for size in args.sizes:
+        results.update(bench_synthetic(size, args.repeat))
+
+    try:
+        baseline = json.loads(args.baseline.read_text())
+    except (OSError, ValueError):
+        baseline = {}
+    print_table(results, baseline)
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f'REGRESSION: {regression}')
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f'Saved baseline to {args.baseline}')
+    if args.check and regressions:
+        raise SystemExit(f'{len(regressions)} benchmark regressions beyond {args.threshold:.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""Rebuild the generated station data for every city in parallel.
+
+Discovers each ``src/app/(game)/<city>/data/preprocess.{py,ts}``, runs the
+Python scripts with this interpreter and the TypeScript ones through
+``scripts/run-ts.js``, at most ``--jobs`` at a time. A city is skipped when
+neither its script, the files it reads nor the modules it imports have
+changed since its last successful build (for Python scripts that includes
+``scripts/metro_data``) and its outputs are still present.
+Fingerprints live in each city's ``data/.cache/build.json``.
+
+    python scripts/build-data.py               # every city, one job per core
+    python scripts/build-data.py hk chicago    # just these
+    python scripts/build-data.py --force --jobs 4
+"""
+
+import argparse
+import concurrent.futures
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+GAME_DIR = ROOT_DIR / 'src' / 'app' / '(game)'
+RUN_TS = ROOT_DIR / 'scripts' / 'run-ts.js'
+# Shared package imported by every Python preprocessor.
+METRO_DATA_DIR = ROOT_DIR / 'scripts' / 'metro_data'
+OUTPUT_NAMES = {'features.json', 'routes.json', 'lines.json', 'stations.bin'}
+# Per-line chunks written by the Python preprocessors' --chunks.
+CHUNK_DIR = 'features'
+# Pre-compressed siblings written by the Python preprocessors' --compress.
+COMPRESSED_SUFFIXES = ('.gz', '.br')
+# Files next to a city's data directory that preprocessors read as sources.
+SOURCE_SUFFIXES = {'.json', '.geojson', '.csv', '.txt'}
+IGNORED_DIRS = {'.cache', '__pycache__', 'node_modules'}
+IMPORT_RE = re.compile(r"""(?:from|import)\s+['"]((?:\.{1,2}|@)/[^'"]+)['"]""")
+MODULE_SUFFIXES = ['', '.ts', '.tsx', '.js', '.json', '/index.ts', '/index.js']
+
+
+def discover(cities=None):
+    scripts = sorted(path for path in GAME_DIR.glob('*/data/preprocess.*') if path.suffix in ('.py', '.ts'))
+    if cities:
+        unknown = set(cities) - {city_of(script) for script in scripts}
+        if unknown:
+            raise SystemExit(f"No preprocess script for: {', '.join(sorted(unknown))}")
+        scripts = [script for script in scripts if city_of(script) in cities]
+    return scripts
+
+
+def city_of(script: Path) -> str:
+    return script.parent.parent.name
+
+
+def command(script: Path, python_args) -> list:
+    if script.suffix == '.py':
+        return [sys.executable, str(script), *python_args]
+    return ['node', str(RUN_TS), str(script)]
+
+
+def imported_files(script: Path) -> list:
+    """Local modules imported by ``script`` (``./x``, ``../x`` and ``@/x``), one level deep."""
+    found = []
+    for specifier in IMPORT_RE.findall(script.read_text(encoding='utf-8')):
+        if specifier.startswith('@/'):
+            base = ROOT_DIR / 'src' / specifier[2:]
+        else:
+            base = script.parent / specifier
+        for suffix in MODULE_SUFFIXES:
+            candidate = Path(f'{base}{suffix}')
+            if candidate.is_file():
+                found.append(candidate.resolve())
+                break
+    return found
+
+
+def is_compressed_output(path: Path) -> bool:
+    return path.suffix in COMPRESSED_SUFFIXES and path.stem in OUTPUT_NAMES
+
+
+def output_sizes(script: Path) -> dict:
+    """Total bytes of a city's outputs as written and of their .gz/.br siblings, where present."""
+    sizes = {}
+    for name in OUTPUT_NAMES:
+        path = script.parent / name
+        if not path.exists():
+            continue
+        sizes['raw'] = sizes.get('raw', 0) + path.stat().st_size
+        for suffix in COMPRESSED_SUFFIXES:
+            sibling = path.with_name(name + suffix)
+            if sibling.exists():
+                sizes[suffix[1:]] = sizes.get(suffix[1:], 0) + sibling.stat().st_size
+    return sizes
+
+
+def input_files(script: Path) -> list:
+    data_dir = script.parent
+    files = {script}
+    for path in data_dir.rglob('*'):
+        relative = path.relative_to(data_dir)
+        if IGNORED_DIRS.intersection(relative.parts) or not path.is_file() or relative.parts[0] == CHUNK_DIR:
+            continue
+        if len(relative.parts) == 1 and (path.name in OUTPUT_NAMES or is_compressed_output(path)):
+            continue
+        files.add(path)
+    for path in data_dir.parent.iterdir():
+        if path.is_file() and path.suffix in SOURCE_SUFFIXES:
+            files.add(path)
+    files.update(imported_files(script))
+    if script.suffix == '.ts':
+        files.add(RUN_TS)
+    else:
+        files.update(METRO_DATA_DIR.glob('*.py'))
+    return sorted(files)
+
+
+def fingerprint(script: Path, python_args) -> str:
+    digest = hashlib.sha256(json.dumps(command(script, python_args)[1:]).encode())
+    for path in input_files(script):
+        digest.update(str(path.relative_to(ROOT_DIR)).encode())
+        digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def state_path(script: Path) -> Path:
+    return script.parent / '.cache' / 'build.json'
+
+
+def is_fresh(script: Path, key: str) -> bool:
+    try:
+        state = json.loads(state_path(script).read_text())
+    except (OSError, ValueError):
+        return False
+    return state.get('fingerprint') == key and all((script.parent / name).exists() for name in state.get('outputs', []))
+
+
+def save_state(script: Path, key: str) -> None:
+    path = state_path(script)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    outputs = sorted(name for name in OUTPUT_NAMES if (script.parent / name).exists())
+    tmp_path = path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps({'fingerprint': key, 'outputs': outputs}, indent=2))
+    os.replace(tmp_path, path)
+
+
+def build(script: Path, python_args) -> dict:
+    # Threads only wait on child processes, so the pool bounds concurrent builds.
+    start = time.perf_counter()
+    try:
+        result = subprocess.run(
+            command(script, python_args),
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+        )
+        status = 'built' if result.returncode == 0 else 'failed'
+        output = result.stdout + result.stderr
+    except OSError as error:
+        status, output = 'failed', str(error)
+    return {'status': status, 'seconds': time.perf_counter() - start, 'output': output}
+
+
+def format_kb(size) -> str:
+    return '-' if size is None else f'{size / 1024:.1f}'
+
+
+def print_summary(results: dict, wall: float) -> None:
+    print(f"{'city':<20} {'script':<14} {'status':<8} {'seconds':>8} {'raw KB':>9} {'gz KB':>8} {'br KB':>8}")
+    for city, row in sorted(results.items(), key=lambda item: item[1]['seconds'], reverse=True):
+        sizes = row.get('sizes', {})
+        print(
+            f"{city:<20} {row['script']:<14} {row['status']:<8} {row['seconds']:>8.2f} "
+            f"{format_kb(sizes.get('raw')):>9} {format_kb(sizes.get('gz')):>8} {format_kb(sizes.get('br')):>8}"
+        )
+    counts = {status: sum(row['status'] == status for row in results.values()) for status in ('built', 'skipped', 'failed')}
+    busy = sum(row['seconds'] for row in results.values())
+    print(
+        f"{counts['built']} built, {counts['skipped']} skipped, {counts['failed']} failed "
+        f'in {wall:.2f}s ({busy:.2f}s of build time)'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Rebuild generated city data in parallel')
+    parser.add_argument('cities', nargs='*', help='city directory names (default: every city with a preprocess script)')
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help='concurrent builds')
+    parser.add_argument('--force', action='store_true', help='rebuild cities even when nothing changed')
+    parser.add_argument('--dry-run', action='store_true', help='list what would be rebuilt without running anything')
+    parser.add_argument('--verbose', '-v', action='store_true', help='print the output of every build, not just failures')
+    parser.add_argument(
+        '--python-args',
+        default='',
+        help="extra arguments for the Python preprocessors, e.g. '--format compact --compress gz br'",
+    )
+    args = parser.parse_args()
+    python_args = args.python_args.split()
+
+    start = time.perf_counter()
+    results = {}
+    pending = {}
+    for script in discover(args.cities):
+        key = fingerprint(script, python_args)
+        if not args.force and is_fresh(script, key):
+            results[city_of(script)] = {
+                'script': script.name,
+                'status': 'skipped',
+                'seconds': 0.0,
+                'sizes': output_sizes(script),
+            }
+        else:
+            pending[script] = key
+
+    if args.dry_run:
+        for script in pending:
+            print(f'would build {city_of(script)} ({script.name})')
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        futures = {pool.submit(build, script, python_args): script for script in pending}
+        for future in concurrent.futures.as_completed(futures):
+            script = futures[future]
+            city = city_of(script)
+            row = future.result()
+            results[city] = {'script': script.name, **row, 'sizes': output_sizes(script)}
+            print(f"{row['status']:<7} {city} ({row['seconds']:.2f}s)", flush=True)
+            if row['status'] == 'built':
+                save_state(script, pending[script])
+            if args.verbose or row['status'] == 'failed':
+                for line in row['output'].rstrip().splitlines()[-20:]:
+                    print(f'  {line}')
+
+    print_summary(results, time.perf_counter() - start)
+    failed = sorted(city for city, row in results.items() if row['status'] == 'failed')
+    if failed:
+        raise SystemExit(f"Failed: {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Shared building blocks for the Python city preprocessors.
+
+A city script declares its sources, line definitions and output options and
+hands them to these modules:
+
+- ``sources``: streaming GeoJSON adapters and (cached) index construction
+- ``index``: the token/trigram/spatial ``StationIndex`` and its disk cache
+- ``matching``: ``stop()`` definitions, batched resolution and the line cache
+- ``routes``: ``RouteBuilder`` for station and route FeatureCollections
+- ``validate``: geometric sanity checks for the built stop sequences
+- ``output``: compact JSON, coordinate rounding, polylines and stations.bin
+- ``compress``: reusable ``.gz``/``.br`` siblings of the outputs
+- ``profiling`` / ``cli``: per-stage profiling and the shared command-line options
+- ``watch``: polling rebuild loop behind ``--watch``
+
+City scripts live in ``src/app/(game)/<city>/data`` and put this directory's
+parent on ``sys.path`` before importing it.
+"""
+
+from .compress import compress_outputs, print_compression_report
+from .geo import EARTH_RADIUS_M, NEAR_RADIUS_M, SpatialIndex, haversine_path
+from .index import IndexCache, StationIndex, station_entry
+from .matching import FUZZY_THRESHOLD, BatchResolver, LineCache, build_features, resolve_line, stop
+from .normalize import NORMALIZER, NameNormalizer, tokenize
+from .output import (
+    canonical,
+    encode_binary,
+    encode_polyline,
+    encode_routes,
+    print_size_report,
+    print_unchanged,
+    serialize,
+    with_precision,
+    write_atomic,
+    write_outputs,
+)
+from .profiling import PROFILER, StageProfiler
+from .routes import RouteBuilder, features_collection, routes_collection, with_route_metrics
+from .sources import GeoJSONFeatureStream, GeoJSONSource, build_index, load_index
+from .validate import check_geometry, print_issues
@@ -0,0 +1,115 @@
+"""Command-line options shared by the city preprocessors."""
+
+import argparse
+from pathlib import Path
+from typing import Optional
+
+from . import compress
+from .compress import FORMATS
+from .profiling import PROFILER
+
+
+def compress_format(value: str) -> str:
+    """``--compress`` value; a missing brotli package is reported before any output is written."""
+    if value == 'br' and compress.brotli is None:
+        raise argparse.ArgumentTypeError('br needs the brotli package: pip install brotli')
+    return value
+
+
+def add_output_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--format',
+        choices=['pretty', 'compact'],
+        default='pretty',
+        help='pretty: indented JSON for review; compact: minified JSON for shipping',
+    )
+    parser.add_argument(
+        '--precision',
+        type=int,
+        help='round coordinates to this many decimals (default: 6 for compact output, full precision for pretty)',
+    )
+    parser.add_argument(
+        '--route-encoding',
+        choices=['none', 'polyline'],
+        default='none',
+        help='polyline: store route geometries as encoded polylines (decode with src/lib/polyline.ts)',
+    )
+    parser.add_argument(
+        '--names',
+        choices=['inline', 'table'],
+        default='inline',
+        help='table: store each distinct alternate-name list once in features.json (expand with src/lib/nameTable.ts)',
+    )
+    parser.add_argument(
+        '--binary',
+        action='store_true',
+        help='also write stations.bin, a typed-array artifact read by src/lib/stationBinary.ts',
+    )
+    parser.add_argument(
+        '--chunks',
+        action='store_true',
+        help='also write features/<LINE>.json per line and a features/index.json listing them',
+    )
+    parser.add_argument(
+        '--compress',
+        nargs='+',
+        type=compress_format,
+        choices=FORMATS,
+        default=[],
+        help='also write maximally compressed .gz and/or .br siblings of every top-level output (br needs the brotli package)',
+    )
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--profile', action='store_true', help='print wall time and peak memory per stage')
+    parser.add_argument('--profile-json', type=Path, help='append per-stage timings to this file as JSON lines')
+    parser.add_argument(
+        '--profile-dump',
+        type=Path,
+        help='profile every stage and write cProfile stats and tracemalloc top allocations for the slowest one here',
+    )
+
+
+def output_precision(args: argparse.Namespace) -> Optional[int]:
+    if args.precision is not None:
+        return args.precision
+    return 6 if args.format == 'compact' else None
+
+
+def route_encoding(args: argparse.Namespace) -> Optional[str]:
+    return None if args.route_encoding == 'none' else args.route_encoding
+
+
+def wants_size_report(args: argparse.Namespace) -> bool:
+    """Whether the output differs from the pretty baseline, making a size comparison worth printing."""
+    return (
+        args.format == 'compact'
+        or output_precision(args) is not None
+        or route_encoding(args) is not None
+        or args.names == 'table'
+        or args.binary
+    )
+
+
+def display_path(path: Path) -> Path:
+    """``path`` relative to the working directory when it is inside it, else absolute."""
+    try:
+        return path.resolve().relative_to(Path.cwd())
+    except ValueError:
+        return path.resolve()
+
+
+def start_profiling(args: argparse.Namespace) -> None:
+    if args.profile or args.profile_json or args.profile_dump:
+        PROFILER.enable(dump_dir=args.profile_dump)
+
+
+def report_profile(args: argparse.Namespace, script: str) -> None:
+    if not PROFILER.enabled:
+        return
+    if args.profile or not args.profile_json:
+        PROFILER.print_table()
+    if args.profile_json:
+        PROFILER.write_jsonl(args.profile_json, script)
+    for path in PROFILER.dump():
+        print(f'Wrote {PROFILER.slowest()} profile to {path}')
@@ -0,0 +1,107 @@
+"""Pre-compressed ``.gz`` and ``.br`` siblings for the generated data files."""
+
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Sequence
+
+from .profiling import PROFILER
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+FORMATS = ('gz', 'br')
+
+
+def compress(payload: bytes, fmt: str) -> bytes:
+    """``payload`` at maximum compression; gzip output has a zero mtime so it is reproducible."""
+    if fmt == 'gz':
+        return gzip.compress(payload, compresslevel=9, mtime=0)
+    return brotli.compress(payload, quality=11)
+
+
+def remove_siblings(path: Path) -> None:
+    """Delete every compressed sibling of ``path``, e.g. after its content changed."""
+    for fmt in FORMATS:
+        path.with_name(f'{path.name}.{fmt}').unlink(missing_ok=True)
+
+
+class CompressionManifest:
+    """SHA-256 of the source each sibling was last compressed from, in ``.cache/compressed.json``."""
+
+    def __init__(self, output_dir: Path) -> None:
+        self.path = output_dir / '.cache' / 'compressed.json'
+        try:
+            self.entries: Dict[str, str] = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.entries, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.path)
+
+
+def _compress_file(source: Path, fmt: str, key: str, digest: str, manifest: CompressionManifest) -> int:
+    """Compress ``source`` to its ``fmt`` sibling unless ``manifest[key]`` shows it is current."""
+    target = source.with_name(f'{source.name}.{fmt}')
+    if manifest.entries.get(key) == digest and target.exists():
+        return target.stat().st_size
+    payload = compress(source.read_bytes(), fmt)
+    tmp_path = target.with_name(f'.{target.name}.tmp')
+    tmp_path.write_bytes(payload)
+    os.replace(tmp_path, target)
+    return len(payload)
+
+
+def compress_outputs(
+    output_dir: Path,
+    filenames: Iterable[str],
+    formats: Sequence[str],
+    workers: Optional[int] = None,
+) -> Dict[str, Dict[str, int]]:
+    """Write a ``<file>.<fmt>`` sibling of each output in a thread pool.
+
+    A sibling is only recompressed when the SHA-256 of its source differs
+    from the one recorded when it was last written, so unchanged outputs cost
+    one hash each. zlib and brotli release the GIL, so threads compress in
+    parallel. Files in subdirectories (the per-line chunks) are skipped,
+    since the bundler imports them and would choke on a ``.gz``/``.br``
+    next to them. Returns ``{filename: {'raw': bytes, fmt: compressed bytes}}``.
+    """
+    if 'br' in formats and brotli is None:
+        raise SystemExit('Brotli output needs the brotli package: pip install brotli')
+    manifest = CompressionManifest(output_dir)
+    sizes: Dict[str, Dict[str, int]] = {}
+    with PROFILER.stage('compress'):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {}
+            digests = {}
+            for filename in filenames:
+                if Path(filename).parent != Path('.'):
+                    continue
+                source = output_dir / filename
+                digests[filename] = hashlib.sha256(source.read_bytes()).hexdigest()
+                sizes[filename] = {'raw': source.stat().st_size}
+                for fmt in formats:
+                    key = f'{filename}.{fmt}'
+                    future = pool.submit(_compress_file, source, fmt, key, digests[filename], manifest)
+                    futures[future] = (filename, fmt, key)
+            for future in concurrent.futures.as_completed(futures):
+                filename, fmt, key = futures[future]
+                sizes[filename][fmt] = future.result()
+                manifest.entries[key] = digests[filename]
+        manifest.save()
+    return sizes
+
+
+def print_compression_report(sizes: Dict[str, Dict[str, int]]) -> None:
+    for filename, row in sizes.items():
+        compressed = ', '.join(f'{fmt} {size:,} ({size / row["raw"]:.0%})' for fmt, size in row.items() if fmt != 'raw')
+        print(f'{filename}: {row["raw"]:,} bytes raw, {compressed}')
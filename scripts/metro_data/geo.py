@@ -0,0 +1,119 @@
+"""Spherical geometry helpers and the nearest-station KD-tree."""
+
+import math
+from array import array
+from typing import Callable, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+# Default search radius for stops resolved by position rather than by name.
+NEAR_RADIUS_M = 150.0
+
+
+def unit_vector(lon: float, lat: float) -> Tuple[float, float, float]:
+    lon_r = math.radians(lon)
+    lat_r = math.radians(lat)
+    cos_lat = math.cos(lat_r)
+    return cos_lat * math.cos(lon_r), cos_lat * math.sin(lon_r), math.sin(lat_r)
+
+
+def meters_to_chord(meters: float) -> float:
+    return 2 * math.sin(min(meters / EARTH_RADIUS_M, math.pi) / 2)
+
+
+def chord_to_meters(chord: float) -> float:
+    return 2 * EARTH_RADIUS_M * math.asin(min(chord / 2, 1.0))
+
+
+def haversine_path(coords: Sequence[Sequence[float]]) -> array:
+    """Great-circle meters between each consecutive pair of ``[lon, lat]`` points.
+
+    One pass over the whole sequence; callers concatenate many lines and
+    ignore the pairs that straddle a line boundary, which is far cheaper than
+    a call per line.
+    """
+    lons = [math.radians(point[0]) for point in coords]
+    lats = [math.radians(point[1]) for point in coords]
+    cos_lats = [math.cos(lat) for lat in lats]
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    diameter = 2 * EARTH_RADIUS_M
+    return array(
+        'd',
+        (
+            diameter * asin(min(1.0, sqrt(sin((lat2 - lat1) / 2) ** 2 + cos1 * cos2 * sin((lon2 - lon1) / 2) ** 2)))
+            for lat1, lat2, cos1, cos2, lon1, lon2 in zip(lats, lats[1:], cos_lats, cos_lats[1:], lons, lons[1:])
+        ),
+    )
+
+
+class SpatialIndex:
+    """KD-tree over station coordinates for nearest-station lookups.
+
+    Points are stored as unit vectors on the sphere, so straight-line
+    (chord) distance orders candidates exactly like great-circle distance.
+    The tree is implicit: ``order[lo:hi]`` is a subtree whose root is its
+    median element, split on axis ``depth % 3``.
+    """
+
+    def __init__(self, coords: Sequence[float]) -> None:
+        self.xyz = array('d')
+        for i in range(0, len(coords), 2):
+            self.xyz.extend(unit_vector(coords[i], coords[i + 1]))
+        self.order = array('I', range(len(coords) // 2))
+        self._build(0, len(self.order), 0)
+
+    def _build(self, lo: int, hi: int, depth: int) -> None:
+        if hi - lo <= 1:
+            return
+        axis = depth % 3
+        xyz = self.xyz
+        self.order[lo:hi] = array('I', sorted(self.order[lo:hi], key=lambda p: xyz[3 * p + axis]))
+        mid = (lo + hi) // 2
+        self._build(lo, mid, depth + 1)
+        self._build(mid + 1, hi, depth + 1)
+
+    def nearest(
+        self,
+        lon: float,
+        lat: float,
+        max_distance_m: float = NEAR_RADIUS_M,
+        accept: Optional[Callable[[int], bool]] = None,
+    ) -> Optional[Tuple[int, float]]:
+        """Return ``(position, meters)`` of the closest accepted point within range."""
+        query = unit_vector(lon, lat)
+        xyz = self.xyz
+        order = self.order
+        best = None
+        best_d2 = meters_to_chord(max_distance_m) ** 2
+        stack = [(0, len(order), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            position = order[mid]
+            base = 3 * position
+            dx = query[0] - xyz[base]
+            dy = query[1] - xyz[base + 1]
+            dz = query[2] - xyz[base + 2]
+            d2 = dx * dx + dy * dy + dz * dz
+            if (d2 < best_d2 or (d2 == best_d2 and best is not None and position < best)) and (
+                accept is None or accept(position)
+            ):
+                best, best_d2 = position, d2
+            axis = depth % 3
+            diff = query[axis] - xyz[base + axis]
+            near_side, far_side = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            if diff * diff <= best_d2:
+                stack.append((far_side[0], far_side[1], depth + 1))
+            stack.append((near_side[0], near_side[1], depth + 1))
+        if best is None:
+            return None
+        return best, chord_to_meters(math.sqrt(best_d2))
+
+    def nearest_many(
+        self,
+        points: Sequence[Tuple[float, float]],
+        max_distance_m: float = NEAR_RADIUS_M,
+        accept: Optional[Callable[[int], bool]] = None,
+    ) -> List[Optional[Tuple[int, float]]]:
+        return [self.nearest(lon, lat, max_distance_m, accept) for lon, lat in points]
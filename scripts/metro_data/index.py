@@ -0,0 +1,342 @@
+"""Token, trigram and spatial search over source stations, and its on-disk cache."""
+
+import hashlib
+import heapq
+import json
+import os
+import pickle
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from .geo import NEAR_RADIUS_M, SpatialIndex
+from .normalize import NORMALIZER, TOKENIZER_VERSION
+
+# Bump when the source adapters change what gets indexed.
+INDEX_VERSION = 3
+
+
+def station_entry(name: str, coord, agency: str) -> Optional[dict]:
+    if not name or coord is None or len(coord) != 2:
+        return None
+    lon, lat = coord
+    if lon is None or lat is None:
+        return None
+    tokens = NORMALIZER.tokens(name)
+    if not tokens:
+        return None
+    return {
+        'name': name,
+        'coord': [float(lon), float(lat)],
+        'agency': agency,
+        'tokens': tokens,
+    }
+
+
+def trigrams(tokens) -> FrozenSet[str]:
+    """pg_trgm-style trigrams: each token padded with two leading spaces and one trailing."""
+    grams = set()
+    for token in tokens:
+        padded = f'  {token} '
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+class TrigramIndex:
+    """Ranks index entries by trigram similarity to a query, for near-miss names.
+
+    Similarity is ``shared / (query + entry - shared)`` over the trigram sets
+    of the normalized tokens, so misspellings, dropped suffixes and swapped
+    word order still score highly.
+    """
+
+    def __init__(self, token_sets: Sequence[FrozenSet[str]]) -> None:
+        self.sizes = array('H')
+        self.postings: Dict[str, array] = {}
+        for position, tokens in enumerate(token_sets):
+            grams = trigrams(tokens)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array('I')
+                posting.append(position)
+
+    def search(
+        self,
+        tokens: FrozenSet[str],
+        limit: int = 5,
+        accept: Optional[Callable[[int], bool]] = None,
+    ) -> List[Tuple[int, float]]:
+        """Return up to ``limit`` ``(position, similarity)`` pairs, best first."""
+        grams = trigrams(tokens)
+        shared = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in grams))
+        sizes = self.sizes
+        query_size = len(grams)
+        scored = [
+            (count / (query_size + sizes[position] - count), position)
+            for position, count in shared.items()
+            if accept is None or accept(position)
+        ]
+        best = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
+        return [(position, similarity) for similarity, position in best]
+
+
+def _contains_sorted(values: Sequence[int], value: int) -> bool:
+    i = bisect_left(values, value)
+    return i < len(values) and values[i] == value
+
+
+class StationIndex:
+    """Token-searchable station index stored in flat typed arrays.
+
+    Entry ``i`` has its name in ``names[i]``, its coordinate at
+    ``coords[2 * i : 2 * i + 2]`` and its agency as an interned ID. Tokens
+    are interned into a shared vocabulary and stored CSR-style: the token
+    IDs of entry ``i`` are ``token_ids[token_offsets[i] : token_offsets[i + 1]]``.
+    """
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.coords = array('d')
+        self.agencies: List[str] = []
+        self.agency_lookup: Dict[str, int] = {}
+        self.agency_ids = array('I')
+        self.vocab: List[str] = []
+        self.vocab_lookup: Dict[str, int] = {}
+        self.token_ids = array('I')
+        self.token_offsets = array('I', [0])
+        # token ID -> ascending positions of the entries containing it
+        self.postings: List[array] = []
+        # IndexCache key of the sources this index was built from, if known
+        self.source_key: Optional[str] = None
+        self._spatial: Optional[SpatialIndex] = None
+        self._trigrams: Optional[TrigramIndex] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str, coord, agency: str) -> None:
+        entry = station_entry(name, coord, agency)
+        if entry:
+            self.insert(entry)
+
+    def insert(self, entry: dict) -> None:
+        position = len(self.names)
+        self.names.append(entry['name'])
+        self.coords.extend(entry['coord'])
+        agency_id = self.agency_lookup.get(entry['agency'])
+        if agency_id is None:
+            agency_id = self.agency_lookup[entry['agency']] = len(self.agencies)
+            self.agencies.append(entry['agency'])
+        self.agency_ids.append(agency_id)
+        # Sorted so token IDs do not depend on the (per-process) string hash seed.
+        for token in sorted(entry['tokens']):
+            token_id = self.vocab_lookup.get(token)
+            if token_id is None:
+                token_id = self.vocab_lookup[token] = len(self.vocab)
+                self.vocab.append(token)
+                self.postings.append(array('I'))
+            self.token_ids.append(token_id)
+            self.postings[token_id].append(position)
+        self.token_offsets.append(len(self.token_ids))
+        self._spatial = None
+        self._trigrams = None
+
+    def entry(self, position: int) -> dict:
+        return {
+            'name': self.names[position],
+            'coord': [self.coords[2 * position], self.coords[2 * position + 1]],
+            'agency': self.agencies[self.agency_ids[position]],
+            'tokens': self.entry_tokens(position),
+        }
+
+    def to_state(self) -> dict:
+        """Plain-data snapshot, picklable regardless of how this module was imported."""
+        return {key: value for key, value in vars(self).items() if not key.startswith('_')}
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'StationIndex':
+        index = cls()
+        vars(index).update(state)
+        return index
+
+    def candidates(self, tokens: FrozenSet[str]) -> List[int]:
+        """Return positions of entries whose tokens are a superset of ``tokens``, ascending."""
+        postings = []
+        for token in tokens:
+            token_id = self.vocab_lookup.get(token)
+            if token_id is None:
+                return []
+            postings.append(self.postings[token_id])
+        postings.sort(key=len)
+        matches = list(postings[0])
+        for posting in postings[1:]:
+            if len(matches) * max(len(posting).bit_length(), 1) < len(posting):
+                # Few survivors against a long list: binary-search each one instead of scanning it.
+                matches = [position for position in matches if _contains_sorted(posting, position)]
+            else:
+                matches = sorted(set(matches).intersection(posting))
+            if not matches:
+                return []
+        return matches
+
+    def find(self, query: str, agencies: Optional[List[str]] = None):
+        tokens = NORMALIZER.tokens(query)
+        if not tokens:
+            return None
+        candidates = self.candidates(tokens)
+        accept = self._agency_filter(agencies)
+        if accept is not None:
+            preferred = [position for position in candidates if accept(position)]
+            if preferred:
+                candidates = preferred
+        if not candidates:
+            return None
+        offsets = self.token_offsets
+        names = self.names
+        best = min(candidates, key=lambda p: (offsets[p + 1] - offsets[p] - len(tokens), names[p]))
+        return self.entry(best)
+
+    def spatial(self) -> SpatialIndex:
+        if self._spatial is None:
+            self._spatial = SpatialIndex(self.coords)
+        return self._spatial
+
+    def entry_tokens(self, position: int) -> FrozenSet[str]:
+        start, end = self.token_offsets[position], self.token_offsets[position + 1]
+        return frozenset(self.vocab[token_id] for token_id in self.token_ids[start:end])
+
+    def fuzzy(self, query: str, limit: int = 5, agencies: Optional[List[str]] = None) -> List[dict]:
+        """Distinct-name near-matches for ``query`` ranked by trigram similarity, preferring ``agencies``."""
+        tokens = NORMALIZER.tokens(query)
+        if not tokens:
+            return []
+        if self._trigrams is None:
+            self._trigrams = TrigramIndex([self.entry_tokens(position) for position in range(len(self))])
+        accept = self._agency_filter(agencies)
+        # Sources often repeat a name (e.g. "X" and "X Station" adapters), so over-fetch before deduplicating.
+        hits = self._trigrams.search(tokens, limit * 4, accept) if accept is not None else []
+        if not hits:
+            hits = self._trigrams.search(tokens, limit * 4)
+        results = []
+        seen = set()
+        for position, similarity in hits:
+            if self.names[position] in seen:
+                continue
+            seen.add(self.names[position])
+            entry = self.entry(position)
+            entry['similarity'] = similarity
+            results.append(entry)
+            if len(results) == limit:
+                break
+        return results
+
+    def _agency_filter(self, agencies: Optional[List[str]]) -> Optional[Callable[[int], bool]]:
+        if not agencies:
+            return None
+        agency_ids = {self.agency_lookup[agency] for agency in agencies if agency in self.agency_lookup}
+        return lambda position: self.agency_ids[position] in agency_ids
+
+    def nearest(self, coord, max_distance_m: float = NEAR_RADIUS_M, agencies: Optional[List[str]] = None):
+        """Closest entry to ``coord`` within ``max_distance_m``, preferring ``agencies``."""
+        return self.nearest_many([coord], max_distance_m, agencies)[0]
+
+    def nearest_many(self, coords, max_distance_m: float = NEAR_RADIUS_M, agencies: Optional[List[str]] = None):
+        spatial = self.spatial()
+        accept = self._agency_filter(agencies)
+        results = []
+        for lon, lat in coords:
+            hit = None
+            if accept is not None:
+                hit = spatial.nearest(lon, lat, max_distance_m, accept)
+            if hit is None:
+                hit = spatial.nearest(lon, lat, max_distance_m)
+            if hit is None:
+                results.append(None)
+                continue
+            entry = self.entry(hit[0])
+            entry['distance_m'] = hit[1]
+            results.append(entry)
+        return results
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with path.open('rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IndexCache:
+    """On-disk cache of built StationIndex objects.
+
+    Entries are keyed by the content hash of every source file plus the
+    tokenizer and adapter versions. Source hashes are remembered per
+    (size, mtime) so unchanged files are not re-read, and the directory is
+    kept under ``max_bytes`` by evicting the least recently used entries.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.manifest_path = directory / 'hashes.json'
+
+    def _file_hashes(self, paths: List[Path]) -> List[str]:
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            manifest = {}
+        hashes = []
+        changed = False
+        for path in paths:
+            stat = path.stat()
+            entry = manifest.get(str(path))
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                hashes.append(entry['sha256'])
+                continue
+            digest = file_sha256(path)
+            manifest[str(path)] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+            hashes.append(digest)
+            changed = True
+        if changed:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self.manifest_path.write_text(json.dumps(manifest, indent=2))
+        return hashes
+
+    def key(self, paths: List[Path], extra: str = '') -> str:
+        digest = hashlib.sha256(f'tokenizer={TOKENIZER_VERSION};index={INDEX_VERSION};{extra}'.encode())
+        for file_hash in self._file_hashes(paths):
+            digest.update(file_hash.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[StationIndex]:
+        path = self.directory / f'index-{key}.pickle'
+        try:
+            with path.open('rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        os.utime(path)
+        return StationIndex.from_state(state)
+
+    def put(self, key: str, index: StationIndex) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f'index-{key}.pickle'
+        tmp_path = path.with_suffix('.tmp')
+        with tmp_path.open('wb') as f:
+            pickle.dump(index.to_state(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = sorted(self.directory.glob('index-*.pickle'), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+        total = 0
+        for path in entries:
+            total += path.stat().st_size
+            if total > self.max_bytes:
+                path.unlink(missing_ok=True)
@@ -0,0 +1,256 @@
+"""Resolving line definitions against a StationIndex and assembling the results."""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .geo import NEAR_RADIUS_M
+from .index import StationIndex
+from .profiling import PROFILER
+from .routes import RouteBuilder
+
+# Minimum trigram similarity for --match-mode auto to accept a fuzzy match.
+FUZZY_THRESHOLD = 0.7
+# Bump whenever resolve_line's output or the matching logic changes, so
+# cached lines written by older code are re-matched.
+LINE_CACHE_VERSION = 2
+
+
+def stop(
+    name: str,
+    match: Optional[str] = None,
+    agencies: Optional[List[str]] = None,
+    alternate: Optional[List[str]] = None,
+    near: Optional[Tuple[float, float]] = None,
+    radius: float = NEAR_RADIUS_M,
+) -> Dict:
+    """Define a stop, matched by name or, when ``near`` is given, by the closest source station."""
+    return {
+        'name': name,
+        'match': match or name,
+        'agencies': agencies,
+        'alternate_names': alternate or [],
+        'near': list(near) if near else None,
+        'radius': radius,
+    }
+
+
+class LineCache:
+    """Resolved stops per line, reused while a line's definition is unchanged.
+
+    Each entry is keyed by a fingerprint of the line's agencies and stop
+    definitions together with the StationIndex source key and
+    ``LINE_CACHE_VERSION``, so editing one ``stop()`` only re-matches that
+    line. Feature IDs are not cached; they are reassigned in line order when
+    the features are assembled.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        try:
+            self.entries: Dict[str, dict] = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def fingerprint(info: Dict, source_key: str) -> str:
+        payload = json.dumps(
+            {'version': LINE_CACHE_VERSION, 'agency': info.get('agency'), 'stops': info['stops'], 'source': source_key},
+            sort_keys=True,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, line_id: str, fingerprint: str) -> Optional[dict]:
+        entry = self.entries.get(line_id)
+        if entry and entry['fingerprint'] == fingerprint:
+            self.hits += 1
+            return entry['resolved']
+        self.misses += 1
+        return None
+
+    def put(self, line_id: str, fingerprint: str, resolved: dict) -> None:
+        self.entries[line_id] = {'fingerprint': fingerprint, 'resolved': resolved}
+
+    def save(self, line_ids) -> None:
+        self.entries = {line_id: entry for line_id, entry in self.entries.items() if line_id in line_ids}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.entries))
+        os.replace(tmp_path, self.path)
+
+
+def stop_query(stop_info: Dict, agencies: Optional[List[str]]) -> tuple:
+    """Hashable key describing everything that decides how a stop resolves."""
+    near = stop_info.get('near')
+    if near:
+        return ('near', tuple(near), stop_info['radius'], tuple(agencies or ()))
+    return ('name', stop_info['match'], tuple(agencies or ()))
+
+
+class BatchResolver:
+    """Resolves the stop queries of many lines at once, each distinct query only once.
+
+    Shared segments (SUBWAY_STOPS, POWELL_SHARED, BART trunk stations) appear
+    on several lines; their queries are deduplicated before any index lookup,
+    the agency-less fallback ``find`` is memoized per name, and position-based
+    stops are answered with one ``nearest_many`` call per (agencies, radius).
+    """
+
+    def __init__(self, index: StationIndex, fuzzy_threshold: Optional[float] = None) -> None:
+        self.index = index
+        self.fuzzy_threshold = fuzzy_threshold
+        # query -> (entry or None, fuzzy similarity or None)
+        self.results: Dict[tuple, Tuple[Optional[dict], Optional[float]]] = {}
+        self.requested = 0
+        self._any_agency: Dict[str, Optional[dict]] = {}
+
+    @property
+    def saved(self) -> int:
+        return self.requested - len(self.results)
+
+    def resolve_all(self, lines: Dict[str, Dict]) -> None:
+        pending = {}
+        for info in lines.values():
+            agencies = info.get('agency')
+            for stop_info in info['stops']:
+                self.requested += 1
+                query = stop_query(stop_info, agencies)
+                if query not in self.results:
+                    pending[query] = None
+
+        near_groups: Dict[tuple, List[tuple]] = {}
+        for query in pending:
+            if query[0] == 'near':
+                near_groups.setdefault((query[2], query[3]), []).append(query)
+            else:
+                self.results[query] = self._resolve_name(query[1], list(query[2]) or None)
+        for (radius, agencies), queries in near_groups.items():
+            found = self.index.nearest_many([query[1] for query in queries], radius, list(agencies) or None)
+            for query, entry in zip(queries, found):
+                self.results[query] = (entry, None)
+
+    def _find_any_agency(self, match_name: str) -> Optional[dict]:
+        if match_name not in self._any_agency:
+            self._any_agency[match_name] = self.index.find(match_name)
+        return self._any_agency[match_name]
+
+    def _resolve_name(self, match_name: str, agencies: Optional[List[str]]) -> Tuple[Optional[dict], Optional[float]]:
+        found = (self.index.find(match_name, agencies) if agencies else None) or self._find_any_agency(match_name)
+        if found or self.fuzzy_threshold is None:
+            return found, None
+        best = self.index.fuzzy(match_name, limit=1, agencies=agencies)
+        if best and best[0]['similarity'] >= self.fuzzy_threshold:
+            return best[0], best[0]['similarity']
+        return None, None
+
+    def lookup(self, stop_info: Dict, agencies: Optional[List[str]]) -> Tuple[Optional[dict], Optional[float]]:
+        return self.results[stop_query(stop_info, agencies)]
+
+
+def resolve_line(
+    index: StationIndex,
+    line_id: str,
+    info: Dict,
+    fuzzy_threshold: Optional[float] = None,
+    resolver: Optional[BatchResolver] = None,
+) -> dict:
+    """Match a line's stops against the index.
+
+    With ``fuzzy_threshold`` set, a stop that no name lookup finds falls back to
+    the best trigram match scoring at least that much; such substitutions are
+    listed under ``fuzzy`` so they can be reported and reviewed. Pass a
+    ``resolver`` that has already batch-resolved this line to skip lookups.
+    """
+    if resolver is None:
+        resolver = BatchResolver(index, fuzzy_threshold)
+        resolver.resolve_all({line_id: info})
+    agencies = info.get('agency')
+    stops = []
+    missing = []
+    fuzzy = []
+    for stop_info in info['stops']:
+        name = stop_info['name']
+        match_name = stop_info['match']
+        alternate = stop_info.get('alternate_names', [])
+        found, similarity = resolver.lookup(stop_info, agencies)
+        if not found:
+            missing.append([line_id, name, match_name])
+            continue
+        if similarity is not None:
+            fuzzy.append([line_id, name, match_name, found['name'], similarity])
+        resolved = {'name': name, 'coord': found['coord']}
+        alts = list(alternate)
+        if match_name != name:
+            alts.append(match_name)
+        if alts:
+            resolved['alternate_names'] = sorted(set(alts))
+        stops.append(resolved)
+    return {'stops': stops, 'missing': missing, 'fuzzy': fuzzy}
+
+
+def build_features(
+    index: StationIndex,
+    lines: Dict[str, Dict],
+    line_cache: Optional[LineCache] = None,
+    fuzzy_threshold: Optional[float] = None,
+    resolver: Optional[BatchResolver] = None,
+):
+    """Resolve every line in ``lines`` and assemble the station and route features.
+
+    Returns ``(features, routes, stations_per_line, missing, fuzzy,
+    route_stops)``, where ``missing`` lists ``(line, stop, match)`` for
+    unresolved stops, ``fuzzy`` the trigram substitutions made under
+    ``fuzzy_threshold`` and ``route_stops`` the station names along each route.
+    """
+    missing: List[tuple] = []
+    fuzzy: List[tuple] = []
+
+    with PROFILER.stage('match'):
+        resolved_lines: Dict[str, dict] = {}
+        fingerprints: Dict[str, str] = {}
+        pending: Dict[str, Dict] = {}
+        for line_id, info in lines.items():
+            if line_cache is not None and index.source_key:
+                fingerprints[line_id] = LineCache.fingerprint(info, f'{index.source_key};fuzzy={fuzzy_threshold}')
+                cached = line_cache.get(line_id, fingerprints[line_id])
+                if cached is not None:
+                    resolved_lines[line_id] = cached
+                    continue
+            pending[line_id] = info
+
+        if resolver is None:
+            resolver = BatchResolver(index, fuzzy_threshold)
+        resolver.resolve_all(pending)
+        for line_id, info in pending.items():
+            resolved_lines[line_id] = resolve_line(index, line_id, info, fuzzy_threshold, resolver)
+            if line_id in fingerprints:
+                line_cache.put(line_id, fingerprints[line_id], resolved_lines[line_id])
+
+    with PROFILER.stage('assemble'):
+        builder = RouteBuilder()
+        for line_id in lines:
+            resolved = resolved_lines[line_id]
+            missing.extend(tuple(entry) for entry in resolved['missing'])
+            fuzzy.extend(tuple(entry) for entry in resolved['fuzzy'])
+            builder.start_line(line_id)
+            route_coords = []
+            route_names = []
+            for stop_info in resolved['stops']:
+                coord = stop_info['coord']
+                route_coords.append(coord)
+                route_names.append(stop_info['name'])
+                properties = {'name': stop_info['name'], 'line': line_id}
+                if 'alternate_names' in stop_info:
+                    properties['alternate_names'] = stop_info['alternate_names']
+                builder.add_station(coord, properties)
+            builder.add_route(route_coords, {'line': line_id}, route_names)
+
+    if line_cache is not None:
+        with PROFILER.stage('cache'):
+            line_cache.save(lines.keys())
+
+    return builder.features, builder.routes, builder.stations_per_line, missing, fuzzy, builder.route_stops
@@ -0,0 +1,131 @@
+"""Station-name normalization shared by every index and query."""
+
+import re
+from functools import lru_cache
+from typing import FrozenSet, Optional
+
+ORDINAL_ONES = {
+    0: '',
+    1: 'first',
+    2: 'second',
+    3: 'third',
+    4: 'fourth',
+    5: 'fifth',
+    6: 'sixth',
+    7: 'seventh',
+    8: 'eighth',
+    9: 'ninth',
+}
+ORDINAL_TEENS = {
+    10: 'tenth',
+    11: 'eleventh',
+    12: 'twelfth',
+    13: 'thirteenth',
+    14: 'fourteenth',
+    15: 'fifteenth',
+    16: 'sixteenth',
+    17: 'seventeenth',
+    18: 'eighteenth',
+    19: 'nineteenth',
+}
+ORDINAL_TENS = {
+    20: 'twentieth',
+    30: 'thirtieth',
+    40: 'fortieth',
+    50: 'fiftieth',
+    60: 'sixtieth',
+    70: 'seventieth',
+    80: 'eightieth',
+    90: 'ninetieth',
+}
+TENS_WORD = {
+    20: 'twenty',
+    30: 'thirty',
+    40: 'forty',
+    50: 'fifty',
+    60: 'sixty',
+    70: 'seventy',
+    80: 'eighty',
+    90: 'ninety',
+}
+
+
+def number_to_ordinal_word(n: int) -> Optional[str]:
+    if n <= 0:
+        return None
+    if n < 10:
+        return ORDINAL_ONES[n]
+    if 10 <= n < 20:
+        return ORDINAL_TEENS[n]
+    if n in ORDINAL_TENS:
+        return ORDINAL_TENS[n]
+    tens, ones = divmod(n, 10)
+    tens_value = tens * 10
+    if tens_value not in TENS_WORD or ones not in ORDINAL_ONES:
+        return None
+    base = TENS_WORD[tens_value]
+    return base + ORDINAL_ONES[ones]
+
+
+# Bump whenever NameNormalizer output changes; cached indexes embed it in their key.
+TOKENIZER_VERSION = 1
+ORDINAL_SUFFIXES = {'st', 'nd', 'rd', 'th'}
+# number_to_ordinal_word only knows 1..99, so the whole table fits in memory.
+ORDINAL_WORDS = {n: number_to_ordinal_word(n) for n in range(1, 100)}
+TOKEN_SEPARATORS = ['/', '&', '|', '–', '—', '-', '·', '│', '\u2013', '\u2014', '\u2212', '‒', '−', "'"]
+NON_ALNUM_RE = re.compile(r'[\W_]+')
+
+
+class NameNormalizer:
+    """Splits station names into normalized token sets.
+
+    The separator table and ordinal words are built once, and token sets are
+    memoized per distinct input with LRU eviction, so repeated names (every
+    index entry and every query) are only normalized once.
+    """
+
+    def __init__(self, maxsize: int = 8192) -> None:
+        self.separators = str.maketrans({ch: ' ' for ch in TOKEN_SEPARATORS})
+        self.tokens = lru_cache(maxsize=maxsize)(self._tokens)
+
+    def normalize_token(self, token: str) -> str:
+        token = token.lower()
+        if token.endswith('.'):
+            token = token[:-1]
+        if len(token) > 2 and token[-2:] in ORDINAL_SUFFIXES and token[:-2].isdigit():
+            word = ORDINAL_WORDS.get(int(token[:-2]))
+            if word:
+                return word
+        return token
+
+    def _tokens(self, name: str) -> FrozenSet[str]:
+        tokens = []
+        for raw_token in name.lower().translate(self.separators).split():
+            clean = raw_token if raw_token.isalnum() else NON_ALNUM_RE.sub('', raw_token)
+            if not clean:
+                continue
+            tokens.append(self.normalize_token(clean))
+        return frozenset(tokens)
+
+    def hit_rate(self) -> float:
+        info = self.tokens.cache_info()
+        lookups = info.hits + info.misses
+        return info.hits / lookups if lookups else 0.0
+
+    def stats(self) -> str:
+        info = self.tokens.cache_info()
+        return (
+            f'tokenizer cache: {info.hits} hits, {info.misses} misses '
+            f'({self.hit_rate():.1%} hit rate, {info.currsize}/{info.maxsize} entries)'
+        )
+
+
+NORMALIZER = NameNormalizer()
+
+
+def normalize_token(token: str) -> str:
+    return NORMALIZER.normalize_token(token)
+
+
+def tokenize(name: str) -> set[str]:
+    return set(NORMALIZER.tokens(name))
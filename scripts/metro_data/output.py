@@ -0,0 +1,426 @@
+"""Output writers: compact JSON, coordinate rounding, polylines and the stations.bin artifact."""
+
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from .compress import remove_siblings
+from .index import file_sha256
+from .profiling import PROFILER
+
+# Member order of every written Feature; properties keep the order the city
+# script gives them, since lines.json and stationsPerLine order drive the UI.
+FEATURE_KEY_ORDER = ('type', 'geometry', 'properties', 'id')
+# Directory, next to features.json, holding one chunk per line and its index.
+CHUNK_DIR = 'features'
+CHUNK_INDEX = 'index.json'
+CHUNK_VERSION = 1
+
+
+def round_coordinates(coords, precision: int):
+    if isinstance(coords, (int, float)):
+        return round(coords, precision)
+    return [round_coordinates(value, precision) for value in coords]
+
+
+def with_precision(collection: dict, precision: Optional[int]) -> dict:
+    """Copy of ``collection`` with rounded geometry; features share coordinate lists, so never round in place."""
+    if precision is None:
+        return collection
+    return {
+        **collection,
+        'features': [
+            {
+                **feature,
+                'geometry': {
+                    **feature['geometry'],
+                    'coordinates': round_coordinates(feature['geometry']['coordinates'], precision),
+                },
+            }
+            for feature in collection['features']
+        ],
+    }
+
+
+def encode_polyline(coords, precision: int = 6) -> str:
+    """Encode ``[[lon, lat], ...]`` with the Google polyline algorithm (lat/lon order).
+
+    Each vertex is scaled by ``10 ** precision``, rounded, and stored as the
+    zigzag-encoded delta from the previous vertex in 5-bit chunks offset by 63.
+    ``decodePolyline`` in src/lib/polyline.ts is the matching decoder.
+    """
+    factor = 10**precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lon, lat in coords:
+        lat_i = round(lat * factor)
+        lon_i = round(lon * factor)
+        for delta in (lat_i - prev_lat, lon_i - prev_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lon = lat_i, lon_i
+    return ''.join(out)
+
+
+def encode_routes(collection: dict, precision: int = 6) -> dict:
+    """Replace LineString coordinates with polyline strings; see src/lib/polyline.ts for the format."""
+    features = []
+    for feature in collection['features']:
+        geometry = feature['geometry']
+        if geometry['type'] == 'LineString':
+            geometry = {'type': 'LineString', 'polyline': encode_polyline(geometry['coordinates'], precision)}
+        features.append({**feature, 'geometry': geometry})
+    return {**collection, 'encoding': {'geometry': 'polyline', 'precision': precision}, 'features': features}
+
+
+def with_name_table(collection: dict) -> dict:
+    """Store each distinct ``alternate_names`` list once; see src/lib/nameTable.ts for the format.
+
+    Interchanges list the same names on every line they serve, so the
+    collection gains a top-level ``alternateNames`` array of distinct lists
+    and each feature's ``alternate_names`` becomes ``alternate_names_ref``,
+    the index of its list, in the same property position.
+    """
+    table: List[list] = []
+    table_ids: Dict[tuple, int] = {}
+    features = []
+    for feature in collection['features']:
+        names = feature['properties'].get('alternate_names')
+        if names is None:
+            features.append(feature)
+            continue
+        key = tuple(names)
+        if key not in table_ids:
+            table_ids[key] = len(table)
+            table.append(names)
+        properties = {}
+        for name, value in feature['properties'].items():
+            if name == 'alternate_names':
+                properties['alternate_names_ref'] = table_ids[key]
+            else:
+                properties[name] = value
+        features.append({**feature, 'properties': properties})
+    return {
+        **collection,
+        'encoding': {**collection.get('encoding', {}), 'alternateNames': 'table'},
+        'alternateNames': table,
+        'features': features,
+    }
+
+
+BINARY_MAGIC = b'MMST'
+BINARY_VERSION = 1
+
+
+def encode_binary(features: List[dict], routes: List[dict]) -> bytes:
+    """Pack stations and routes into the stations.bin layout read by src/lib/stationBinary.ts.
+
+    All integers are little-endian. A 40-byte header (magic ``MMST``, then
+    uint32 version, station count S, line count L, route count R, route
+    vertex count V, alternate-name count A, string count N, string byte
+    length B, reserved) is followed by these sections, ordered so each
+    typed array is naturally aligned:
+
+    - float64 station coords [2S] (lon, lat) and route coords [2V]
+    - uint32 string offsets [N + 1], station IDs [S], station name string [S],
+      alternate-name offsets [S + 1], alternate-name strings [A], line ID
+      strings [L], line station offsets [L + 1], route vertex offsets [R + 1]
+    - uint16 station line [S] and route line [R]
+    - UTF-8 string bytes [B]
+
+    Stations are grouped by line (stable, in order of first appearance) so
+    line ``i`` owns stations ``line_offsets[i] : line_offsets[i + 1]``.
+    """
+    strings: Dict[str, int] = {}
+
+    def string_id(value: str) -> int:
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    line_ids: Dict[str, int] = {}
+    for feature in features:
+        line_ids.setdefault(feature['properties']['line'], len(line_ids))
+    for route in routes:
+        line_ids.setdefault(route['properties']['line'], len(line_ids))
+    ordered = sorted(features, key=lambda feature: line_ids[feature['properties']['line']])
+
+    station_coords = array('d')
+    station_ids = array('I')
+    station_names = array('I')
+    station_lines = array('H')
+    alt_offsets = array('I', [0])
+    alt_names = array('I')
+    line_offsets = array('I', [0] * (len(line_ids) + 1))
+    for feature in ordered:
+        props = feature['properties']
+        station_coords.extend(feature['geometry']['coordinates'])
+        station_ids.append(props['id'])
+        station_names.append(string_id(props['name']))
+        station_lines.append(line_ids[props['line']])
+        line_offsets[line_ids[props['line']] + 1] += 1
+        alt_names.extend(string_id(name) for name in props.get('alternate_names', []))
+        alt_offsets.append(len(alt_names))
+    for i in range(len(line_ids)):
+        line_offsets[i + 1] += line_offsets[i]
+    line_names = array('I', [string_id(line_id) for line_id in line_ids])
+
+    route_coords = array('d')
+    route_offsets = array('I', [0])
+    route_lines = array('H')
+    for route in routes:
+        for coord in route['geometry']['coordinates']:
+            route_coords.extend(coord)
+        route_offsets.append(len(route_coords) // 2)
+        route_lines.append(line_ids[route['properties']['line']])
+
+    encoded = [value.encode('utf-8') for value in strings]
+    string_offsets = array('I', [0])
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+    string_bytes = b''.join(encoded)
+
+    sections = [
+        station_coords,
+        route_coords,
+        string_offsets,
+        station_ids,
+        station_names,
+        alt_offsets,
+        alt_names,
+        line_names,
+        line_offsets,
+        route_offsets,
+        station_lines,
+        route_lines,
+    ]
+    if sys.byteorder == 'big':
+        for section in sections:
+            section.byteswap()
+    header = BINARY_MAGIC + struct.pack(
+        '<9I',
+        BINARY_VERSION,
+        len(ordered),
+        len(line_ids),
+        len(routes),
+        len(route_coords) // 2,
+        len(alt_names),
+        len(encoded),
+        len(string_bytes),
+        0,
+    )
+    return header + b''.join(section.tobytes() for section in sections) + string_bytes
+
+
+def serialize(data, output_format: str = 'pretty', ensure_ascii: bool = True) -> str:
+    if output_format == 'compact':
+        return json.dumps(data, ensure_ascii=ensure_ascii, separators=(',', ':'))
+    return json.dumps(data, ensure_ascii=ensure_ascii, indent=2)
+
+
+def canonical(collection: dict) -> dict:
+    """Copy of ``collection`` with features ordered by ``id`` and their members in ``FEATURE_KEY_ORDER``.
+
+    Features without an ``id`` (routes) keep their order. Two builds of the
+    same data therefore serialize to the same bytes however they were assembled.
+    """
+    features = collection['features']
+    if features and all('id' in feature for feature in features):
+        features = sorted(features, key=lambda feature: feature['id'])
+    rank = {key: position for position, key in enumerate(FEATURE_KEY_ORDER)}
+    return {
+        **collection,
+        'features': [
+            dict(sorted(feature.items(), key=lambda item: rank.get(item[0], len(rank)))) for feature in features
+        ],
+    }
+
+
+def write_atomic(path: Path, payload: bytes) -> bool:
+    """Replace ``path`` with ``payload`` via a temporary sibling, so readers never see a partial file.
+
+    Returns False without touching the file when it already holds ``payload``,
+    which keeps the dev server from recompiling pages for identical data.
+    """
+    try:
+        if path.stat().st_size == len(payload) and file_sha256(path) == hashlib.sha256(payload).hexdigest():
+            return False
+    except OSError:
+        pass
+    tmp_path = path.with_name(f'.{path.name}.tmp')
+    tmp_path.write_bytes(payload)
+    os.replace(tmp_path, path)
+    return True
+
+
+def write_output(path: Path, payload: bytes) -> bool:
+    """``write_atomic`` for a generated output; a changed output drops its compressed siblings.
+
+    Siblings are regenerated by ``compress_outputs`` for the formats asked
+    for, so none is ever left describing an older version of the file.
+    """
+    changed = write_atomic(path, payload)
+    if changed:
+        remove_siblings(path)
+    return changed
+
+
+def chunk_filename(line_id: str) -> str:
+    """File name of a line's chunk; IDs are percent-encoded so any line ID is a safe name.
+
+    The escaping matches JavaScript's ``encodeURIComponent``, which
+    ``src/lib/featureChunks.ts`` uses to find a line's chunk.
+    """
+    return quote(line_id, safe="!'()*") + '.json'
+
+
+def line_chunks(collection: dict) -> Dict[str, dict]:
+    """Split a station FeatureCollection into one FeatureCollection per line.
+
+    Lines follow ``stationsPerLine``, so a line without stations still gets
+    an empty chunk, and each chunk keeps the features' relative order.
+    """
+    grouped: Dict[str, List[dict]] = {line_id: [] for line_id in collection['properties']['stationsPerLine']}
+    for feature in collection['features']:
+        grouped.setdefault(feature['properties']['line'], []).append(feature)
+    return {
+        line_id: {
+            'type': 'FeatureCollection',
+            'features': features,
+            'properties': {'line': line_id, 'totalStations': len(features)},
+        }
+        for line_id, features in grouped.items()
+    }
+
+
+def write_line_chunks(
+    output_dir: Path,
+    collection: dict,
+    precision: Optional[int] = None,
+    ensure_ascii: bool = True,
+) -> Dict[str, Tuple[int, int, bool]]:
+    """Write ``features/<line>.json`` per line as compact JSON, plus ``features/index.json``.
+
+    The index lists each line's ID, chunk file, station count and byte size
+    in line order, so a client can fetch only the lines it renders. Any
+    other file in the directory, such as the chunk of a line that no longer
+    exists or a compressed sibling, is removed: bundlers import the chunks
+    directly and have no loader for ``.gz``/``.br``. Returns sizes keyed by
+    path relative to ``output_dir``, like ``write_outputs``.
+    """
+    chunk_dir = output_dir / CHUNK_DIR
+    chunk_dir.mkdir(parents=True, exist_ok=True)
+    sizes = {}
+    entries = []
+    rounded = line_chunks(with_precision(collection, precision))
+    for line_id, chunk in line_chunks(collection).items():
+        filename = chunk_filename(line_id)
+        if filename == CHUNK_INDEX:
+            raise ValueError(f'Line ID {line_id!r} collides with the chunk index file name')
+        with PROFILER.stage('serialize'):
+            baseline = len(serialize(chunk, ensure_ascii=ensure_ascii).encode())
+            payload = serialize(canonical(rounded[line_id]), 'compact', ensure_ascii).encode('utf-8')
+        with PROFILER.stage('write'):
+            changed = write_output(chunk_dir / filename, payload)
+        sizes[f'{CHUNK_DIR}/{filename}'] = (baseline, len(payload), changed)
+        entries.append({'id': line_id, 'file': filename, 'count': len(chunk['features']), 'bytes': len(payload)})
+
+    current = {entry['file'] for entry in entries} | {CHUNK_INDEX}
+    for path in chunk_dir.iterdir():
+        if path.name not in current:
+            path.unlink()
+
+    index = {'version': CHUNK_VERSION, 'totalStations': len(collection['features']), 'lines': entries}
+    text = serialize(index, 'compact')
+    with PROFILER.stage('write'):
+        changed = write_output(chunk_dir / CHUNK_INDEX, text.encode())
+    sizes[f'{CHUNK_DIR}/{CHUNK_INDEX}'] = (len(serialize(index).encode()), len(text.encode()), changed)
+    return sizes
+
+
+def write_outputs(
+    output_dir: Path,
+    outputs: Dict[str, dict],
+    output_format: str = 'pretty',
+    precision: Optional[int] = None,
+    route_encoding: Optional[str] = None,
+    binary: bool = False,
+    ensure_ascii: bool = True,
+    name_table: bool = False,
+    chunks: bool = False,
+) -> Dict[str, Tuple[int, int, bool]]:
+    """Write ``{filename: data}`` to ``output_dir``, plus stations.bin when ``binary`` is set.
+
+    ``output_format`` is ``'pretty'`` (indented, for review) or ``'compact'``
+    (no whitespace, for shipping). ``precision`` rounds the coordinates of
+    every FeatureCollection to that many decimals; 6 matches the client's
+    ``getStationKey``. With ``route_encoding='polyline'`` the geometries in
+    routes.json are written as encoded polylines, and ``name_table`` stores
+    the alternate names in features.json once per distinct list (see
+    ``with_name_table``). stations.bin is built from features.json and
+    routes.json, and ``chunks`` also splits features.json per line (see
+    ``write_line_chunks``); without ``binary`` or ``chunks``, a stations.bin
+    or chunk directory left by an earlier run is removed. FeatureCollections
+    are written in ``canonical`` order and every file goes through
+    ``write_output``, so files whose content is unchanged are left alone.
+    Returns
+    ``{filename: (pretty full-precision bytes, output bytes, changed)}``.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    sizes = {}
+    for filename, data in outputs.items():
+        with PROFILER.stage('serialize'):
+            baseline = len(serialize(data, ensure_ascii=ensure_ascii).encode())
+            output = data
+            if data.get('type') == 'FeatureCollection':
+                if filename == 'routes.json' and route_encoding == 'polyline':
+                    output = encode_routes(data, 6 if precision is None else precision)
+                else:
+                    output = with_precision(data, precision)
+                if filename == 'features.json' and name_table:
+                    output = with_name_table(output)
+                output = canonical(output)
+            text = serialize(output, output_format, ensure_ascii)
+        with PROFILER.stage('write'):
+            payload = text.encode('utf-8')
+            changed = write_output(output_dir / filename, payload)
+        sizes[filename] = (baseline, len(payload), changed)
+    if binary:
+        with PROFILER.stage('serialize'):
+            payload = encode_binary(outputs['features.json']['features'], outputs['routes.json']['features'])
+        with PROFILER.stage('write'):
+            changed = write_output(output_dir / 'stations.bin', payload)
+        sizes['stations.bin'] = (sizes['features.json'][0] + sizes['routes.json'][0], len(payload), changed)
+    else:
+        # A stations.bin left from an earlier --binary run would no longer
+        # match features.json.
+        (output_dir / 'stations.bin').unlink(missing_ok=True)
+        remove_siblings(output_dir / 'stations.bin')
+    if chunks:
+        sizes.update(write_line_chunks(output_dir, outputs['features.json'], precision, ensure_ascii))
+    else:
+        # Clients prefer the chunk index over features.json, so stale chunks must go.
+        shutil.rmtree(output_dir / CHUNK_DIR, ignore_errors=True)
+    return sizes
+
+
+def print_size_report(sizes: Dict[str, Tuple[int, int, bool]]) -> None:
+    for filename, (baseline, written, _) in sizes.items():
+        saved = baseline - written
+        print(f'{filename}: {written:,} bytes ({saved:,} bytes / {saved / baseline:.0%} smaller than pretty output)')
+
+
+def print_unchanged(sizes: Dict[str, Tuple[int, int, bool]]) -> None:
+    unchanged = [filename for filename, (_, _, changed) in sizes.items() if not changed]
+    if unchanged:
+        print(f"Left {', '.join(unchanged)} untouched (content unchanged)")
@@ -0,0 +1,103 @@
+"""Per-stage wall time and memory accounting for the preprocessors."""
+
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+class StageProfiler:
+    """Wall time and traced memory per pipeline stage.
+
+    Stages are flat and named; a stage entered more than once accumulates its
+    time. ``peak_bytes`` is the highest traced allocation above the stage's
+    starting point and ``retained_bytes`` what was still allocated when it
+    finished. With ``dump_dir`` set every stage also runs under cProfile and
+    is bracketed by tracemalloc snapshots, and ``dump()`` writes both for the
+    slowest stage. A disabled profiler records nothing.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.dump_dir: Optional[Path] = None
+        self.records: Dict[str, dict] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._allocations: Dict[str, List[tracemalloc.StatisticDiff]] = {}
+
+    def enable(self, dump_dir: Optional[Path] = None) -> None:
+        self.enabled = True
+        self.dump_dir = dump_dir
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        before = tracemalloc.take_snapshot() if self.dump_dir else None
+        profile = self._profiles.setdefault(name, cProfile.Profile()) if self.dump_dir else None
+        tracemalloc.reset_peak()
+        start_bytes = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        if profile:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile:
+                profile.disable()
+            seconds = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            record = self.records.setdefault(
+                name, {'stage': name, 'calls': 0, 'seconds': 0.0, 'peak_bytes': 0, 'retained_bytes': 0}
+            )
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['peak_bytes'] = max(record['peak_bytes'], peak - start_bytes)
+            record['retained_bytes'] += current - start_bytes
+            if before is not None:
+                diff = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+                self._allocations[name] = diff + self._allocations.get(name, [])
+
+    def slowest(self) -> Optional[str]:
+        if not self.records:
+            return None
+        return max(self.records.values(), key=lambda record: record['seconds'])['stage']
+
+    def print_table(self) -> None:
+        total = sum(record['seconds'] for record in self.records.values())
+        print(f"{'stage':<12} {'calls':>5} {'seconds':>9} {'share':>6} {'peak MB':>9} {'retained MB':>12}")
+        for record in self.records.values():
+            share = record['seconds'] / total if total else 0.0
+            print(
+                f"{record['stage']:<12} {record['calls']:>5} {record['seconds']:>9.4f} {share:>6.0%} "
+                f"{record['peak_bytes'] / 1e6:>9.2f} {record['retained_bytes'] / 1e6:>12.2f}"
+            )
+        print(f"{'total':<12} {'':>5} {total:>9.4f}")
+
+    def write_jsonl(self, path: Path, script: str) -> None:
+        """Append one JSON object per stage to ``path``."""
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        with path.open('a') as f:
+            for record in self.records.values():
+                f.write(json.dumps(dict(record, script=script, timestamp=timestamp)) + '\n')
+
+    def dump(self, limit: int = 25) -> List[Path]:
+        """Write the cProfile stats and top allocation sites of the slowest stage."""
+        name = self.slowest()
+        if self.dump_dir is None or name is None:
+            return []
+        self.dump_dir.mkdir(parents=True, exist_ok=True)
+        profile_path = self.dump_dir / f'{name}.prof'
+        self._profiles[name].dump_stats(profile_path)
+        alloc_path = self.dump_dir / f'{name}-allocations.txt'
+        diffs = sorted(self._allocations.get(name, []), key=lambda diff: diff.size_diff, reverse=True)
+        alloc_path.write_text(''.join(f'{diff}\n' for diff in diffs[:limit]))
+        return [profile_path, alloc_path]
+
+
+PROFILER = StageProfiler()
@@ -0,0 +1,139 @@
+"""FeatureCollection assembly for stations and their route geometries."""
+
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+from .geo import haversine_path
+
+
+class RouteBuilder:
+    """Collects station Point features and route LineStrings line by line.
+
+    Feature IDs are assigned in insertion order starting at ``first_id`` and
+    stations are counted per ``properties['line']``. Route coordinates are
+    usually the very lists stored on the station features, so output
+    transforms must copy coordinates rather than modify them in place.
+    ``route_stops`` holds, per route, the station name at each vertex.
+    """
+
+    def __init__(self, first_id: int = 1) -> None:
+        self.features: List[dict] = []
+        self.routes: List[dict] = []
+        self.route_stops: List[List[str]] = []
+        self.stations_per_line: Dict[str, int] = {}
+        self.next_id = first_id
+
+    def start_line(self, line_id: str) -> None:
+        """Register ``line_id`` so it is counted even if it ends up with no stations."""
+        self.stations_per_line.setdefault(line_id, 0)
+
+    def add_station(self, coord, properties: dict) -> dict:
+        feature_id = self.next_id
+        self.next_id += 1
+        line_id = properties['line']
+        self.stations_per_line[line_id] = self.stations_per_line.get(line_id, 0) + 1
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': coord},
+            'properties': {'id': feature_id, **properties},
+            'id': feature_id,
+        }
+        self.features.append(feature)
+        return feature
+
+    def add_route(self, coords: list, properties: dict, stop_names: Optional[List[str]] = None) -> Optional[dict]:
+        """Add a LineString through ``coords``; lines with fewer than two points get no route.
+
+        ``stop_names`` names the station at each vertex, for diagnostics.
+        """
+        if len(coords) < 2:
+            return None
+        self.route_stops.append(list(stop_names) if stop_names else [])
+        route = {
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': coords},
+            'properties': properties,
+        }
+        self.routes.append(route)
+        return route
+
+    def features_collection(self) -> dict:
+        return features_collection(self.features, self.stations_per_line)
+
+    def routes_collection(self) -> dict:
+        return routes_collection(self.routes)
+
+
+def features_collection(features: List[dict], stations_per_line: Dict[str, int]) -> dict:
+    return {
+        'type': 'FeatureCollection',
+        'features': features,
+        'properties': {
+            'totalStations': len(features),
+            'stationsPerLine': stations_per_line,
+        },
+    }
+
+
+def _km(meters: float) -> float:
+    return round(meters / 1000, 3)
+
+
+def with_route_metrics(routes: List[dict]) -> Tuple[List[dict], Dict[str, dict]]:
+    """Copies of ``routes`` with geodesic metrics, plus the same metrics per line.
+
+    Each route gains ``lengthKm``, ``meanSpacing`` (the mean distance
+    between consecutive stops, in km) and ``cumDistance``, the km along the
+    route at each vertex. Per line, ``lengthKm`` sums its routes (HK
+    segments) and ``meanSpacing`` averages their hops. Distances are
+    great-circle, rounded to the metre, and come from one haversine pass
+    over every route.
+    """
+    points: List[list] = []
+    for route in routes:
+        points.extend(route['geometry']['coordinates'])
+    hops = haversine_path(points)
+
+    measured = []
+    lines: Dict[str, dict] = {}
+    start = 0
+    for route in routes:
+        count = len(route['geometry']['coordinates'])
+        cumulative = list(accumulate(hops[start:start + count - 1], initial=0.0))
+        start += count
+        length = cumulative[-1]
+        measured.append(
+            {
+                **route,
+                'properties': {
+                    **route['properties'],
+                    'lengthKm': _km(length),
+                    'meanSpacing': _km(length / (count - 1)) if count > 1 else 0.0,
+                    'cumDistance': [_km(distance) for distance in cumulative],
+                },
+            }
+        )
+        line = lines.setdefault(route['properties']['line'], {'meters': 0.0, 'hops': 0})
+        line['meters'] += length
+        line['hops'] += count - 1
+
+    return measured, {
+        line_id: {
+            'lengthKm': _km(line['meters']),
+            'meanSpacing': _km(line['meters'] / line['hops']) if line['hops'] else 0.0,
+        }
+        for line_id, line in lines.items()
+    }
+
+
+def routes_collection(routes: List[dict]) -> dict:
+    """Route FeatureCollection with ``with_route_metrics`` applied; the collection carries the per-line totals."""
+    measured, lines = with_route_metrics(routes)
+    return {
+        'type': 'FeatureCollection',
+        'features': measured,
+        'properties': {
+            'lengthKm': round(sum(line['lengthKm'] for line in lines.values()), 3),
+            'lines': lines,
+        },
+    }
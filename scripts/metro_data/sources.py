@@ -0,0 +1,245 @@
+"""Streaming GeoJSON source adapters and index construction."""
+
+import concurrent.futures
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .index import IndexCache, StationIndex, station_entry
+from .profiling import PROFILER
+
+
+class GeoJSONFeatureStream:
+    """Yields the members of a FeatureCollection's ``features`` array one at a time.
+
+    The file is decoded in chunks with ``json.JSONDecoder.raw_decode``, so
+    memory stays proportional to the chunk size and the largest single
+    feature rather than the whole document. Top-level members other than
+    ``features`` (``name``, ``crs``, ...) are decoded and discarded.
+    """
+
+    def __init__(self, path: Path, chunk_size: int = 1 << 16) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+
+    def __iter__(self) -> Iterator[dict]:
+        with self.path.open(encoding='utf-8') as f:
+            self.file = f
+            self.buf = ''
+            self.pos = 0
+            self.eof = False
+            self._expect('{')
+            if self._peek() == '}':
+                return
+            while True:
+                key = self._value()
+                self._expect(':')
+                if key == 'features':
+                    yield from self._array()
+                else:
+                    self._value()
+                if self._next() == '}':
+                    return
+
+    def _fill(self, min_size: int = 0) -> bool:
+        if self.eof:
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos :]
+            self.pos = 0
+        chunk = self.file.read(max(self.chunk_size, min_size))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf += chunk
+        return True
+
+    def _peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError(f'{self.path}: unexpected end of GeoJSON')
+
+    def _next(self) -> str:
+        ch = self._peek()
+        self.pos += 1
+        return ch
+
+    def _expect(self, expected: str) -> None:
+        ch = self._next()
+        if ch != expected:
+            raise ValueError(f'{self.path}: expected {expected!r}, found {ch!r}')
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                value, end = None, None
+            # A number cut off by the buffer edge still decodes ("1." as 1), so
+            # a value only counts as complete once the delimiter after it is
+            # buffered.
+            if end is not None and (self._delimited(end) or self.eof):
+                self.pos = end
+                return value
+            if not self._fill(min_size=len(self.buf) - self.pos):
+                if end is not None:
+                    self.pos = end
+                    return value
+                raise ValueError(f'{self.path}: malformed GeoJSON near offset {self.pos}')
+
+    def _delimited(self, end: int) -> bool:
+        while end < len(self.buf) and self.buf[end].isspace():
+            end += 1
+        return end < len(self.buf) and self.buf[end] in ',:]}'
+
+    def _array(self) -> Iterator[dict]:
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            ch = self._next()
+            if ch == ']':
+                return
+            if ch != ',':
+                raise ValueError(f'{self.path}: expected \',\' or \']\', found {ch!r}')
+
+
+def _first(props: dict, fields: Sequence[str]):
+    for field in fields:
+        value = props.get(field)
+        if value:
+            return value
+    return None
+
+
+class GeoJSONSource:
+    """Declarative adapter from one GeoJSON file's features to index entries.
+
+    ``name_fields`` and ``agency_fields`` are property names tried in order;
+    features without a name are skipped and ``default_agency`` fills in a
+    missing agency. Coordinates come from the Point geometry, or, when it is
+    absent or ``use_geometry`` is off, from the first set ``lon_fields`` /
+    ``lat_fields`` properties. Each name is indexed once per entry in
+    ``suffixes`` (``''`` for the bare name), skipping a suffix the name
+    already ends with. The adapter is plain data, so it pickles into process
+    pools and its ``spec()`` can key the index cache.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        name_fields: Sequence[str],
+        agency_fields: Sequence[str] = (),
+        default_agency: str = 'Unknown',
+        lon_fields: Sequence[str] = (),
+        lat_fields: Sequence[str] = (),
+        use_geometry: bool = True,
+        title_case: bool = False,
+        suffixes: Sequence[str] = ('',),
+    ) -> None:
+        self.path = path
+        self.name_fields = tuple(name_fields)
+        self.agency_fields = tuple(agency_fields)
+        self.default_agency = default_agency
+        self.lon_fields = tuple(lon_fields)
+        self.lat_fields = tuple(lat_fields)
+        self.use_geometry = use_geometry
+        self.title_case = title_case
+        self.suffixes = tuple(suffixes)
+
+    def spec(self) -> dict:
+        return {key: str(value) if isinstance(value, Path) else value for key, value in vars(self).items()}
+
+    def coordinate(self, feature: dict, props: dict):
+        geometry = feature.get('geometry')
+        if self.use_geometry and geometry and geometry.get('coordinates'):
+            return geometry['coordinates']
+        lon = _first(props, self.lon_fields)
+        lat = _first(props, self.lat_fields)
+        if lon is None or lat is None:
+            return None
+        return [lon, lat]
+
+    def read(self) -> List[Optional[dict]]:
+        entries = []
+        for feature in GeoJSONFeatureStream(self.path):
+            props = feature['properties']
+            name = _first(props, self.name_fields)
+            if not name:
+                continue
+            coord = self.coordinate(feature, props)
+            if coord is None:
+                continue
+            if self.title_case:
+                name = name.title()
+            agency = _first(props, self.agency_fields) or self.default_agency
+            for suffix in self.suffixes:
+                if suffix and name.endswith(suffix.strip()):
+                    continue
+                entries.append(station_entry(name + suffix, coord, agency))
+        return entries
+
+
+def build_index(
+    sources: Sequence[GeoJSONSource],
+    manual_coords: Optional[Dict[str, Tuple[float, float]]] = None,
+    parallel: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> StationIndex:
+    """Parse every source and index it, followed by ``manual_coords`` under agency ``'Manual'``.
+
+    ``parallel`` is None to read sources one after another, or ``'thread'`` /
+    ``'process'`` to parse and tokenize them concurrently in a pool. Results
+    are merged in ``sources`` order either way, so the index is identical;
+    order matters because ``find()`` breaks ranking ties by position.
+    """
+    with PROFILER.stage('parse'):
+        if parallel is None:
+            batches = [source.read() for source in sources]
+        else:
+            pool_cls = concurrent.futures.ProcessPoolExecutor if parallel == 'process' else concurrent.futures.ThreadPoolExecutor
+            with pool_cls(max_workers=workers or len(sources)) as pool:
+                futures = [pool.submit(source.read) for source in sources]
+                batches = [future.result() for future in futures]
+
+    with PROFILER.stage('index'):
+        index = StationIndex()
+        for entries in batches:
+            for entry in entries:
+                if entry:
+                    index.insert(entry)
+
+        for name, (lon, lat) in (manual_coords or {}).items():
+            index.add(name, (lon, lat), 'Manual')
+
+    return index
+
+
+def load_index(
+    sources: Sequence[GeoJSONSource],
+    manual_coords: Optional[Dict[str, Tuple[float, float]]] = None,
+    cache_dir: Optional[Path] = None,
+    parallel: Optional[str] = None,
+) -> StationIndex:
+    """``build_index``, reusing a cached index from ``cache_dir`` while no input has changed."""
+    if cache_dir is None:
+        return build_index(sources, manual_coords, parallel)
+    cache = IndexCache(cache_dir)
+    with PROFILER.stage('cache'):
+        extra = json.dumps({'sources': [source.spec() for source in sources], 'manual': manual_coords}, sort_keys=True)
+        key = cache.key([source.path for source in sources], extra=extra)
+        index = cache.get(key)
+    if index is None:
+        index = build_index(sources, manual_coords, parallel)
+        with PROFILER.stage('cache'):
+            cache.put(key, index)
+    index.source_key = key
+    return index
@@ -0,0 +1,128 @@
+"""Geometric sanity checks for built station and route features.
+
+Wrong matches (a stop resolved to another agency's station of the same name)
+usually show up as a hop far longer than the rest of the line, a station
+outside the city, or two different stations on one spot.
+"""
+
+import bisect
+import statistics
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .geo import haversine_path
+from .profiling import PROFILER
+
+# Consecutive stops closer than this are the same place resolved twice.
+ZERO_HOP_M = 1.0
+# A hop is a jump when it is this many times the line's median hop and at
+# least MIN_JUMP_M long, so lines with short urban spacing still allow
+# long express or bridge sections.
+JUMP_FACTOR = 4.0
+MIN_JUMP_M = 5000.0
+
+Issue = Tuple[str, str, str]
+
+
+def check_geometry(
+    features: List[dict],
+    routes: List[dict],
+    bounds: Optional[Sequence[float]] = None,
+    route_stops: Optional[List[List[str]]] = None,
+    expected_jumps: Iterable[Tuple[str, str, str]] = (),
+) -> List[Issue]:
+    """Flag suspicious geometry as ``(kind, line_id, message)`` tuples.
+
+    ``kind`` is ``'jump'`` for an outlier hop between consecutive route
+    points, ``'zero-hop'`` for consecutive points on the same spot,
+    ``'duplicate'`` for differently named stations of one line sharing a
+    coordinate and ``'bbox'`` for stations outside ``bounds``
+    (``(min_lon, min_lat, max_lon, max_lat)``). Hop distances for every
+    route are computed in a single haversine pass. ``route_stops``, as kept
+    by ``RouteBuilder``, names the stations at each hop's ends; without it
+    hops are labelled by coordinates. ``expected_jumps`` lists
+    ``(line_id, station, station)`` hops that are genuinely long (a tunnel,
+    a bridge, a rural stretch), in either direction; they are not reported.
+    """
+    issues: List[Issue] = []
+    allowed = {(line_id, frozenset((a, b))) for line_id, a, b in expected_jumps}
+    with PROFILER.stage('validate'):
+        lines = [feature['properties']['line'] for feature in features]
+        coords = [feature['geometry']['coordinates'] for feature in features]
+        keys = list(zip(lines, map(tuple, coords)))
+        names: Dict[Tuple[str, tuple], str] = {}
+        shared = {key for key, count in Counter(keys).items() if count > 1}
+        for position in [position for position, key in enumerate(keys) if key in shared] if shared else []:
+            key = keys[position]
+            name = features[position]['properties']['name']
+            other = names.setdefault(key, name)
+            if other != name:
+                lon, lat = key[1][:2]
+                issues.append(('duplicate', key[0], f'{name} and {other} share {lon:.6f},{lat:.6f}'))
+        if bounds and coords:
+            min_lon, min_lat, max_lon, max_lat = bounds
+            lons = [coord[0] for coord in coords]
+            lats = [coord[1] for coord in coords]
+            if min(lons) < min_lon or max(lons) > max_lon or min(lats) < min_lat or max(lats) > max_lat:
+                for position, (lon, lat) in enumerate(zip(lons, lats)):
+                    if not (min_lon <= lon <= max_lon and min_lat <= lat <= max_lat):
+                        name = features[position]['properties']['name']
+                        issues.append(
+                            ('bbox', lines[position], f'{name} at {lon:.5f},{lat:.5f} is outside {tuple(bounds)}')
+                        )
+
+        points: List[Sequence[float]] = []
+        starts: List[int] = []
+        spans: List[Tuple[str, int, int]] = []
+        for route in routes:
+            coords = route['geometry']['coordinates']
+            starts.append(len(points))
+            spans.append((route['properties']['line'], len(points), len(points) + len(coords) - 1))
+            points.extend(coords)
+        hops = haversine_path(points)
+
+        line_hops: Dict[str, List[float]] = {}
+        for line_id, start, end in spans:
+            line_hops.setdefault(line_id, []).extend(hops[start:end])
+        limits = {
+            line_id: max(JUMP_FACTOR * statistics.median(distances), MIN_JUMP_M)
+            for line_id, distances in line_hops.items()
+            if distances
+        }
+
+        # Every line's limit is at least MIN_JUMP_M, so one scan over all hops
+        # finds the candidates; only those are checked against their line.
+        candidates = [
+            position for position, distance in enumerate(hops) if distance < ZERO_HOP_M or distance > MIN_JUMP_M
+        ]
+        if not candidates:
+            return issues
+        def label(route: int, position: int) -> str:
+            names = route_stops[route] if route_stops else None
+            if names and len(names) == spans[route][2] - spans[route][1] + 1:
+                return names[position - spans[route][1]]
+            point = points[position]
+            return f'{point[0]:.5f},{point[1]:.5f}'
+
+        for position in candidates:
+            route = bisect.bisect_right(starts, position) - 1
+            line_id, start, end = spans[route]
+            distance = hops[position]
+            if position >= end or ZERO_HOP_M <= distance <= limits[line_id]:
+                continue
+            ends = (label(route, position), label(route, position + 1))
+            if distance > ZERO_HOP_M and (line_id, frozenset(ends)) in allowed:
+                continue
+            hop = f'{ends[0]} -> {ends[1]}'
+            if distance < ZERO_HOP_M:
+                issues.append(('zero-hop', line_id, f'{hop} are {distance:.2f} m apart'))
+            else:
+                issues.append(
+                    ('jump', line_id, f'{hop} is {distance / 1000:.1f} km (limit {limits[line_id] / 1000:.1f} km)')
+                )
+    return issues
+
+
+def print_issues(issues: List[Issue]) -> None:
+    for kind, line_id, message in issues:
+        print(f'{kind.upper()}: line={line_id} {message}')
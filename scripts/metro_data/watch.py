@@ -0,0 +1,93 @@
+"""Rebuild a city's data whenever its script or source files change."""
+
+import importlib.util
+import time
+import traceback
+from pathlib import Path
+from types import ModuleType
+from typing import Callable, Dict, Iterable, Set, Tuple
+
+# Seconds between polls; a handful of stat() calls, so cheap enough to keep
+# rebuilds within a few hundred milliseconds of a save.
+POLL_INTERVAL = 0.2
+
+
+def load_script(path: Path) -> ModuleType:
+    """Execute a fresh copy of the city script at ``path`` without running its ``main``."""
+    spec = importlib.util.spec_from_file_location(f'{path.parent.parent.name}_preprocess', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class Watcher:
+    """Polls files by modification time and size.
+
+    A file that is missing counts as a state of its own, so deleting and
+    recreating a source is seen as a change.
+    """
+
+    def __init__(self, paths: Iterable[Path]) -> None:
+        self.state: Dict[Path, Tuple[int, int]] = {}
+        self.watch(paths)
+
+    def watch(self, paths: Iterable[Path]) -> None:
+        """Replace the watched set, keeping the known state of paths watched before."""
+        self.state = {path: self.state.get(path, self._stat(path)) for path in paths}
+
+    @staticmethod
+    def _stat(path: Path) -> Tuple[int, int]:
+        try:
+            stat = path.stat()
+        except OSError:
+            return (-1, -1)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self) -> Set[Path]:
+        changed = set()
+        for path, previous in self.state.items():
+            current = self._stat(path)
+            if current != previous:
+                self.state[path] = current
+                changed.add(path)
+        return changed
+
+
+def watch(
+    script: Path,
+    inputs: Callable[[ModuleType], Iterable[Path]],
+    rebuild: Callable[[ModuleType, Set[Path]], None],
+    interval: float = POLL_INTERVAL,
+) -> None:
+    """Build once, then call ``rebuild(module, changed)`` after every change until interrupted.
+
+    ``module`` is the city script, re-executed whenever ``script`` itself
+    changes so edits to its line definitions take effect; ``inputs(module)``
+    lists the source files it reads. Errors, including ``SystemExit`` from
+    unmatched stops, are reported and the watch continues.
+    """
+    watcher = Watcher([script])
+    changed = {script}
+    module = None
+    try:
+        while True:
+            if changed:
+                start = time.perf_counter()
+                status = 'Rebuilt'
+                try:
+                    if script in changed:
+                        module = load_script(script)
+                        watcher.watch([script, *inputs(module)])
+                    rebuild(module, changed)
+                except SystemExit as error:
+                    print(error)
+                    status = 'Failed'
+                except Exception:
+                    traceback.print_exc()
+                    status = 'Failed'
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f'{status} in {elapsed:.0f} ms; watching {len(watcher.state)} files for changes')
+            time.sleep(interval)
+            changed = watcher.poll()
+    except KeyboardInterrupt:
+        pass
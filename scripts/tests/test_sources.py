@@ -0,0 +1,39 @@
+"""Tests for the streaming GeoJSON reader; run with ``python -m unittest discover scripts/tests``."""
+
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from metro_data.sources import GeoJSONFeatureStream  # noqa: E402
+
+
+class GeoJSONFeatureStreamTest(unittest.TestCase):
+    def stream(self, document: dict, chunk_size: int) -> list:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'source.geojson'
+            path.write_text(json.dumps(document))
+            return list(GeoJSONFeatureStream(path, chunk_size=chunk_size))
+
+    def test_numbers_split_across_chunks(self):
+        # Every chunk size cuts some number after its "." or "e", where the
+        # prefix alone still decodes.
+        document = {
+            'scale': 1.5e-3,
+            'features': [12345, 1.5e-3, -0.125, {'type': 'Feature', 'properties': {'x': 1.25}}],
+            'crs': [1.0e2, 2],
+        }
+        for chunk_size in range(1, 16):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self.stream(document, chunk_size), document['features'])
+
+    def test_empty_collection(self):
+        self.assertEqual(self.stream({}, 1), [])
+        self.assertEqual(self.stream({'features': []}, 1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,57 @@
+import argparse
 import json
+import sys
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Optional
 
 BASE_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BASE_DIR.parents[4] / 'scripts'))
+
+from metro_data import cli, matching, sources, watch  # noqa: E402
+from metro_data.compress import compress_outputs, print_compression_report  # noqa: E402
+from metro_data.index import StationIndex  # noqa: E402
+from metro_data.matching import FUZZY_THRESHOLD, BatchResolver, LineCache, stop  # noqa: E402
+from metro_data.normalize import NORMALIZER  # noqa: E402
+from metro_data.output import print_size_report, print_unchanged, write_outputs  # noqa: E402
+from metro_data.routes import features_collection, routes_collection  # noqa: E402
+from metro_data.sources import GeoJSONSource  # noqa: E402
+from metro_data.validate import check_geometry, print_issues  # noqa: E402
+
 MASTER_PATH = BASE_DIR.parent / 'smart+bart+muni+caltrain+vta.geojson'
 BART_PATH = BASE_DIR.parent / 'BART_Stations_2025.geojson'
 VTA_PATH = BASE_DIR.parent / 'VTA LR stations.geojson'
 SACRT_PATH = BASE_DIR.parent / 'SacRTStops_Rail_Centroid_0402.geojson'
+CACHE_DIR = BASE_DIR / '.cache'
+# (min_lon, min_lat, max_lon, max_lat) covering SMART to the ACE corridor and Sacramento.
+BOUNDS = (-123.2, 36.8, -120.4, 39.0)
+# Long hops that are real geography rather than wrong matches.
+EXPECTED_JUMPS = [
+    ('SacRTGold', 'Sunrise', 'Hazel'),
+]
+
+# Insertion order matters: find() breaks ranking ties by position in the index.
+SOURCES = [
+    GeoJSONSource(MASTER_PATH, ['station_na', 'ts_locatio'], agency_fields=['agencyname', 'mode_']),
+    GeoJSONSource(BART_PATH, ['Name2', 'Name'], default_agency='BART'),
+    GeoJSONSource(
+        VTA_PATH,
+        ['STA_NAME'],
+        default_agency='Santa Clara VTA',
+        lon_fields=['LONG_'],
+        lat_fields=['LAT'],
+        use_geometry=False,
+        suffixes=[' Station', ''],
+    ),
+    GeoJSONSource(
+        SACRT_PATH,
+        ['STOP_NAM_1'],
+        default_agency='SacRT',
+        lon_fields=['LONG_AVG', 'LONG_WB_NB', 'LONG_EB_SB'],
+        lat_fields=['LAT_AVG', 'LAT_WB_SB', 'LAT_EB_SB'],
+        title_case=True,
+        suffixes=['', ' Station'],
+    ),
+]
 
 MANUAL_COORDS = {
     'Santa Clara - Great America': (-121.96703631711618, 37.406930330948676),
@@ -39,200 +84,6 @@ MANUAL_COORDS = {
     '4th St & Brannan St': (-122.397295, 37.776392),
 }
 
-ORDINAL_ONES = {
-    0: '',
-    1: 'first',
-    2: 'second',
-    3: 'third',
-    4: 'fourth',
-    5: 'fifth',
-    6: 'sixth',
-    7: 'seventh',
-    8: 'eighth',
-    9: 'ninth',
-}
-ORDINAL_TEENS = {
-    10: 'tenth',
-    11: 'eleventh',
-    12: 'twelfth',
-    13: 'thirteenth',
-    14: 'fourteenth',
-    15: 'fifteenth',
-    16: 'sixteenth',
-    17: 'seventeenth',
-    18: 'eighteenth',
-    19: 'nineteenth',
-}
-ORDINAL_TENS = {
-    20: 'twentieth',
-    30: 'thirtieth',
-    40: 'fortieth',
-    50: 'fiftieth',
-    60: 'sixtieth',
-    70: 'seventieth',
-    80: 'eightieth',
-    90: 'ninetieth',
-}
-TENS_WORD = {
-    20: 'twenty',
-    30: 'thirty',
-    40: 'forty',
-    50: 'fifty',
-    60: 'sixty',
-    70: 'seventy',
-    80: 'eighty',
-    90: 'ninety',
-}
-
-
-def number_to_ordinal_word(n: int) -> Optional[str]:
-    if n <= 0:
-        return None
-    if n < 10:
-        return ORDINAL_ONES[n]
-    if 10 <= n < 20:
-        return ORDINAL_TEENS[n]
-    if n in ORDINAL_TENS:
-        return ORDINAL_TENS[n]
-    tens, ones = divmod(n, 10)
-    tens_value = tens * 10
-    if tens_value not in TENS_WORD or ones not in ORDINAL_ONES:
-        return None
-    base = TENS_WORD[tens_value]
-    return base + ORDINAL_ONES[ones]
-
-
-def normalize_token(token: str) -> str:
-    token = token.lower()
-    if token.endswith('.'):
-        token = token[:-1]
-    if len(token) > 2 and token[-2:] in {'st', 'nd', 'rd', 'th'} and token[:-2].isdigit():
-        num = int(token[:-2])
-        word = number_to_ordinal_word(num)
-        if word:
-            return word
-    return token
-
-
-def tokenize(name: str) -> set[str]:
-    replacements = ['/', '&', '|', '–', '—', '-', '·', '│', '\u2013', '\u2014', '\u2212', '‒', '−']
-    lower = name.lower()
-    for ch in replacements:
-        lower = lower.replace(ch, ' ')
-    lower = lower.replace("'", ' ')
-    tokens = []
-    for raw_token in lower.split():
-        clean = ''.join(ch for ch in raw_token if ch.isalnum())
-        if not clean:
-            continue
-        tokens.append(normalize_token(clean))
-    return set(tokens)
-
-
-class StationIndex:
-    def __init__(self) -> None:
-        self.features: List[dict] = []
-
-    def add(self, name: str, coord, agency: str) -> None:
-        if not name or coord is None or len(coord) != 2:
-            return
-        lon, lat = coord
-        if lon is None or lat is None:
-            return
-        tokens = tokenize(name)
-        if not tokens:
-            return
-        self.features.append(
-            {
-                'name': name,
-                'coord': [float(lon), float(lat)],
-                'agency': agency,
-                'tokens': tokens,
-            }
-        )
-
-    def find(self, query: str, agencies: Optional[List[str]] = None):
-        tokens = tokenize(query)
-        if not tokens:
-            return None
-        candidates = [feat for feat in self.features if tokens.issubset(feat['tokens'])]
-        if agencies:
-            preferred = [feat for feat in candidates if feat['agency'] in agencies]
-            if preferred:
-                candidates = preferred
-        if not candidates:
-            return None
-        candidates.sort(key=lambda feat: (len(feat['tokens']) - len(tokens), feat['name']))
-        return candidates[0]
-
-
-def load_index() -> StationIndex:
-    index = StationIndex()
-
-    with MASTER_PATH.open() as f:
-        master = json.load(f)
-    for feat in master['features']:
-        props = feat['properties']
-        name = props.get('station_na') or props.get('ts_locatio')
-        if not name:
-            continue
-        coord = feat['geometry']['coordinates']
-        index.add(name, coord, props.get('agencyname') or props.get('mode_') or 'Unknown')
-
-    with BART_PATH.open() as f:
-        bart = json.load(f)
-    for feat in bart['features']:
-        props = feat['properties']
-        name = props.get('Name2') or props.get('Name')
-        coord = feat['geometry']['coordinates']
-        index.add(name, coord, 'BART')
-
-    with VTA_PATH.open() as f:
-        vta = json.load(f)
-    for feat in vta['features']:
-        props = feat['properties']
-        lon = props.get('LONG_')
-        lat = props.get('LAT')
-        if lon is None or lat is None:
-            continue
-        station = props.get('STA_NAME')
-        coord = [lon, lat]
-        if station:
-            index.add(f'{station} Station', coord, 'Santa Clara VTA')
-            index.add(station, coord, 'Santa Clara VTA')
-
-    with SACRT_PATH.open() as f:
-        sacrt = json.load(f)
-    for feat in sacrt['features']:
-        props = feat['properties']
-        geom = feat.get('geometry')
-        if geom and geom.get('coordinates'):
-            coord = geom['coordinates']
-        else:
-            lon = props.get('LONG_AVG') or props.get('LONG_WB_NB') or props.get('LONG_EB_SB')
-            lat = props.get('LAT_AVG') or props.get('LAT_WB_SB') or props.get('LAT_EB_SB')
-            coord = [lon, lat]
-        name = props.get('STOP_NAM_1')
-        if name:
-            pretty = name.title()
-            index.add(pretty, coord, 'SacRT')
-            if not pretty.endswith('Station'):
-                index.add(pretty + ' Station', coord, 'SacRT')
-
-    for name, (lon, lat) in MANUAL_COORDS.items():
-        index.add(name, (lon, lat), 'Manual')
-
-    return index
-
-
-def stop(name: str, match: Optional[str] = None, agencies: Optional[List[str]] = None, alternate: Optional[List[str]] = None) -> Dict:
-    return {
-        'name': name,
-        'match': match or name,
-        'agencies': agencies,
-        'alternate_names': alternate or [],
-    }
-
 
 # Line definitions will be populated below...
 LINES: Dict[str, Dict] = {
@@ -1010,84 +861,112 @@ LINES['SacRTGreen'] = {
         stop('7th & Richards/Township 9', match='Township 9 Station'),
     ],
 }
-def build_features(index: StationIndex):
-    features = []
-    routes = []
-    stations_per_line: Dict[str, int] = {}
-    missing: List[tuple] = []
-    next_id = 1
 
-    for line_id, info in LINES.items():
-        agencies = info.get('agency')
-        stations_per_line[line_id] = 0
-        route_coords = []
-        for stop_info in info['stops']:
-            name = stop_info['name']
-            match_name = stop_info['match']
-            alternate = stop_info.get('alternate_names', [])
-            found = index.find(match_name, agencies) or index.find(match_name)
-            if not found:
-                missing.append((line_id, name, match_name))
-                continue
-            coord = found['coord']
-            route_coords.append(coord)
-            feature = {
-                'type': 'Feature',
-                'geometry': {'type': 'Point', 'coordinates': coord},
-                'properties': {
-                    'id': next_id,
-                    'name': name,
-                    'line': line_id,
-                },
-                'id': next_id,
-            }
-            alts = list(alternate)
-            if match_name != name:
-                alts.append(match_name)
-            if alts:
-                feature['properties']['alternate_names'] = sorted(set(alts))
-            features.append(feature)
-            stations_per_line[line_id] += 1
-            next_id += 1
-        if len(route_coords) >= 2:
-            routes.append(
-                {
-                    'type': 'Feature',
-                    'geometry': {'type': 'LineString', 'coordinates': route_coords},
-                    'properties': {'line': line_id},
-                }
-            )
 
-    return features, routes, stations_per_line, missing
+def load_index(use_cache: bool = True, parallel: Optional[str] = None) -> StationIndex:
+    return sources.load_index(SOURCES, MANUAL_COORDS, CACHE_DIR if use_cache else None, parallel)
 
 
-def write_outputs(features, routes, stations_per_line):
-    output_dir = BASE_DIR
-    output_dir.mkdir(parents=True, exist_ok=True)
+def build_features(
+    index: StationIndex,
+    line_cache: Optional[LineCache] = None,
+    fuzzy_threshold: Optional[float] = None,
+    resolver: Optional[BatchResolver] = None,
+):
+    return matching.build_features(index, LINES, line_cache, fuzzy_threshold, resolver)
 
-    data = {
-        'type': 'FeatureCollection',
-        'features': features,
-        'properties': {
-            'totalStations': len(features),
-            'stationsPerLine': stations_per_line,
-        },
-    }
-    (output_dir / 'features.json').write_text(json.dumps(data, indent=2))
-
-    route_data = {'type': 'FeatureCollection', 'features': routes}
-    (output_dir / 'routes.json').write_text(json.dumps(route_data, indent=2))
 
-
-def main() -> None:
-    index = load_index()
-    features, routes, stations_per_line, missing = build_features(index)
+def run(args: argparse.Namespace, index: Optional[StationIndex] = None) -> None:
+    if index is None:
+        index = load_index(use_cache=not args.no_cache, parallel=args.parallel)
+    line_cache = None if args.no_cache else LineCache(CACHE_DIR / 'lines.json')
+    fuzzy_threshold = args.fuzzy_threshold if args.match_mode == 'auto' else None
+    resolver = BatchResolver(index, fuzzy_threshold)
+    features, routes, stations_per_line, missing, fuzzy, route_stops = build_features(
+        index, line_cache, fuzzy_threshold, resolver
+    )
+    print_issues(check_geometry(features, routes, BOUNDS, route_stops, EXPECTED_JUMPS))
+    for line_id, name, match_name, matched, similarity in fuzzy:
+        print(f'FUZZY: line={line_id} stop={name} match={match_name} -> {matched} (similarity {similarity:.2f})')
     if missing:
         for line_id, name, match_name in missing:
             print(f'MISSING: line={line_id} stop={name} match={match_name}')
+            suggestions = index.fuzzy(match_name, limit=3, agencies=LINES[line_id].get('agency'))
+            if suggestions:
+                print('  did you mean: ' + ', '.join(f"{s['name']!r} ({s['similarity']:.2f})" for s in suggestions))
         raise SystemExit(f'Unable to locate {len(missing)} stops')
-    write_outputs(features, routes, stations_per_line)
+    outputs = {
+        'features.json': features_collection(features, stations_per_line),
+        'routes.json': routes_collection(routes),
+    }
+    sizes = write_outputs(
+        BASE_DIR,
+        outputs,
+        args.format,
+        cli.output_precision(args),
+        cli.route_encoding(args),
+        args.binary,
+        name_table=args.names == 'table',
+        chunks=args.chunks,
+    )
     print(f'Wrote {len(features)} stations across {len(stations_per_line)} lines')
+    print_unchanged(sizes)
+    if cli.wants_size_report(args):
+        print_size_report(sizes)
+    if args.compress:
+        print_compression_report(compress_outputs(BASE_DIR, sizes, args.compress))
+    if line_cache is not None:
+        print(f'Reused {line_cache.hits} of {len(LINES)} resolved lines, re-matched {line_cache.misses}')
+    print(
+        f'Resolved {resolver.requested} stop references with {len(resolver.results)} lookups '
+        f'({resolver.saved} saved by deduplication)'
+    )
+    print(NORMALIZER.stats())
+
+
+def watch_sources(args: argparse.Namespace) -> None:
+    # The index only depends on the sources and MANUAL_COORDS, so it stays in
+    # memory across edits to LINES; the line cache re-matches the edited lines.
+    warm: Dict[str, object] = {}
+
+    def rebuild(spec, changed) -> None:
+        key = json.dumps([[source.spec() for source in spec.SOURCES], spec.MANUAL_COORDS], sort_keys=True)
+        if warm.get('key') != key or changed & {source.path for source in spec.SOURCES}:
+            warm['index'] = spec.load_index(use_cache=not args.no_cache, parallel=args.parallel)
+            warm['key'] = key
+        spec.run(args, warm['index'])
+
+    watch.watch(BASE_DIR / 'preprocess.py', lambda spec: [source.path for source in spec.SOURCES], rebuild)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Build Bay Area features.json and routes.json')
+    parser.add_argument('--no-cache', action='store_true', help='rebuild the station index and every line from scratch')
+    parser.add_argument(
+        '--parallel',
+        choices=['thread', 'process'],
+        help='parse the GeoJSON sources concurrently in a thread or process pool',
+    )
+    parser.add_argument(
+        '--match-mode',
+        choices=['strict', 'auto'],
+        default='strict',
+        help='strict: fail on unmatched stops; auto: accept the best fuzzy match above --fuzzy-threshold',
+    )
+    parser.add_argument('--fuzzy-threshold', type=float, default=FUZZY_THRESHOLD)
+    parser.add_argument('--watch', action='store_true', help='rebuild whenever this script or a source GeoJSON changes')
+    cli.add_output_arguments(parser)
+    cli.add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    cli.start_profiling(args)
+    try:
+        if args.watch:
+            watch_sources(args)
+        else:
+            run(args)
+    finally:
+        cli.report_profile(args, 'bayarea')
 
 
 if __name__ == '__main__':
@@ -1,6 +1,25 @@
-import json
+import argparse
+import sys
 from pathlib import Path
 
+output_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(output_dir.parents[4] / "scripts"))
+
+from metro_data import cli, watch  # noqa: E402
+from metro_data.compress import compress_outputs, print_compression_report  # noqa: E402
+from metro_data.output import print_size_report, print_unchanged, write_outputs  # noqa: E402
+from metro_data.profiling import PROFILER  # noqa: E402
+from metro_data.routes import RouteBuilder  # noqa: E402
+from metro_data.validate import check_geometry, print_issues  # noqa: E402
+
+# (min_lon, min_lat, max_lon, max_lat), the map's maxBounds in config.ts.
+BOUNDS = (113.5, 21.9, 114.6, 22.7)
+# Long hops that are real geography rather than wrong coordinates.
+EXPECTED_JUMPS = [
+    ("TCL", "Sunny Bay (欣澳)", "Tung Chung (東涌)"),
+    ("TML", "Kam Sheung Road (錦上路)", "Tsuen Wan West (荃灣西)"),
+]
+
 lines = [
     {
         "code": "EAL",
@@ -1215,8 +1234,6 @@ lines = [
     },
 ]
 
-output_dir = Path(__file__).resolve().parent
-output_dir.mkdir(parents=True, exist_ok=True)
 
 def hex_to_rgb(hex_color: str):
     hex_color = hex_color.lstrip("#")
@@ -1286,128 +1303,145 @@ def build_alternate_names(station: dict) -> list[str]:
     return sorted({name.strip() for name in alt if name and name.strip()})
 
 
-features = []
-stations_per_line: dict[str, int] = {}
-routes = []
-lines_meta: dict[str, dict] = {}
-
-feature_id = 0
-
-for order, line in enumerate(lines):
-    line_code = line["code"]
-    line_color = line["color"]
-    lines_meta[line_code] = {
-        "name": f'{line["name"]} ({line_code})',
-        "color": line_color,
-        "backgroundColor": darken(line_color, 0.55),
-        "textColor": pick_text_color(line_color),
+def build_line_meta(line: dict, order: int) -> dict:
+    return {
+        "name": f'{line["name"]} ({line["code"]})',
+        "color": line["color"],
+        "backgroundColor": darken(line["color"], 0.55),
+        "textColor": pick_text_color(line["color"]),
         "order": order,
     }
 
-    stations = line.get("stations", [])
-    stations_per_line[line_code] = len(stations)
 
-    coordinates = []
-    station_lookup: dict[str, list[float]] = {}
+def assemble(line_specs: list[dict] | None = None) -> tuple[RouteBuilder, dict[str, dict]]:
+    """Build the station and route features and the line metadata for ``line_specs`` (default ``lines``)."""
+    with PROFILER.stage("assemble"):
+        builder = RouteBuilder()
+        lines_meta: dict[str, dict] = {}
 
-    for index, station in enumerate(stations):
-        feature_id += 1
-        coordinates.append([station["lon"], station["lat"]])
-        station_lookup[station["english"]] = [station["lon"], station["lat"]]
+        for order, line in enumerate(lines if line_specs is None else line_specs):
+            line_code = line["code"]
+            lines_meta[line_code] = build_line_meta(line, order)
+            route_properties = {
+                "line": line_code,
+                "name": line_code,
+                "color": line["color"],
+                "order": order,
+            }
 
-        traditional = station["traditional"]
-        english = station["english"]
-        name = f'{english} ({traditional})'
-        long_name = f'{traditional} {english}'
-        alternate_names = build_alternate_names(station)
+            builder.start_line(line_code)
+            coordinates = []
+            names = []
+            station_lookup: dict[str, list[float]] = {}
+            name_lookup: dict[str, str] = {}
 
-        features.append(
-            {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [station["lon"], station["lat"]],
-                },
-                "properties": {
-                    "id": feature_id,
-                    "name": name,
-                    "long_name": long_name,
-                    "alternate_names": alternate_names,
-                    "line": line_code,
-                    "order": index,
-                },
-                "id": feature_id,
-            }
-        )
+            for index, station in enumerate(line.get("stations", [])):
+                coordinates.append([station["lon"], station["lat"]])
+                station_lookup[station["english"]] = [station["lon"], station["lat"]]
 
-    segments = line.get("segments")
-    if segments:
-        for segment in segments:
-            segment_coords = []
-            for station_name in segment:
-                coords = station_lookup.get(station_name)
-                if not coords:
-                    raise ValueError(
-                        f"Segment for line {line_code} references unknown station '{station_name}'"
-                    )
-                segment_coords.append(coords)
-            if len(segment_coords) >= 2:
-                routes.append(
+                traditional = station["traditional"]
+                english = station["english"]
+                names.append(f"{english} ({traditional})")
+                name_lookup[english] = names[-1]
+                builder.add_station(
+                    [station["lon"], station["lat"]],
                     {
-                        "type": "Feature",
-                        "geometry": {
-                            "type": "LineString",
-                            "coordinates": segment_coords,
-                        },
-                        "properties": {
-                            "line": line_code,
-                            "name": line_code,
-                            "color": line_color,
-                            "order": order,
-                        },
-                    }
+                        "name": names[-1],
+                        "long_name": f"{traditional} {english}",
+                        "alternate_names": build_alternate_names(station),
+                        "line": line_code,
+                        "order": index,
+                    },
                 )
-    elif len(coordinates) >= 2:
-        routes.append(
-            {
-                "type": "Feature",
-                "geometry": {
-                    "type": "LineString",
-                    "coordinates": coordinates,
-                },
-                "properties": {
-                    "line": line_code,
-                    "name": line_code,
-                    "color": line_color,
-                    "order": order,
-                },
-            }
-        )
 
-features_collection = {
-    "type": "FeatureCollection",
-    "features": features,
-    "properties": {
-        "totalStations": len(features),
-        "stationsPerLine": stations_per_line,
-    },
-}
+            segments = line.get("segments")
+            if segments:
+                for segment in segments:
+                    segment_coords = []
+                    segment_names = []
+                    for station_name in segment:
+                        coords = station_lookup.get(station_name)
+                        if not coords:
+                            raise ValueError(
+                                f"Segment for line {line_code} references unknown station '{station_name}'"
+                            )
+                        segment_coords.append(coords)
+                        segment_names.append(name_lookup[station_name])
+                    builder.add_route(segment_coords, dict(route_properties), segment_names)
+            else:
+                builder.add_route(coordinates, route_properties, names)
+
+    return builder, lines_meta
+
+
+def collections(builder: RouteBuilder, lines_meta: dict[str, dict]) -> dict[str, dict]:
+    return {
+        "features.json": builder.features_collection(),
+        "routes.json": builder.routes_collection(),
+        "lines.json": lines_meta,
+    }
+
+
+def build(line_specs: list[dict] | None = None) -> dict[str, dict]:
+    """Build the HK collections in memory, keyed by the file each is written to.
+
+    ``line_specs`` defaults to ``lines``. Nothing is read from or written to
+    disk, so the result can be rebuilt, inspected or written repeatedly.
+    """
+    return collections(*assemble(line_specs))
+
+
+def write(
+    outputs: dict[str, dict],
+    args: argparse.Namespace,
+    directory: Path = output_dir,
+) -> dict[str, tuple[int, int, bool]]:
+    return write_outputs(
+        directory,
+        outputs,
+        args.format,
+        cli.output_precision(args),
+        cli.route_encoding(args),
+        args.binary,
+        ensure_ascii=False,
+        name_table=args.names == "table",
+        chunks=args.chunks,
+    )
+
+
+def run(args: argparse.Namespace) -> None:
+    builder, lines_meta = assemble()
+    print_issues(
+        check_geometry(builder.features, builder.routes, BOUNDS, builder.route_stops, EXPECTED_JUMPS)
+    )
+    outputs = collections(builder, lines_meta)
+    sizes = write(outputs, args)
+    station_count = outputs["features.json"]["properties"]["totalStations"]
+    print(f"Wrote {station_count} stations across {len(outputs['lines.json'])} lines to {cli.display_path(output_dir)}")
+    print_unchanged(sizes)
+    if cli.wants_size_report(args):
+        print_size_report(sizes)
+    if args.compress:
+        print_compression_report(compress_outputs(output_dir, sizes, args.compress))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build Hong Kong features.json, routes.json and lines.json")
+    parser.add_argument("--watch", action="store_true", help="rebuild whenever this script changes")
+    cli.add_output_arguments(parser)
+    cli.add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+    cli.start_profiling(args)
 
-routes_collection = {
-    "type": "FeatureCollection",
-    "features": routes,
-}
+    try:
+        if args.watch:
+            # Every station is defined inline, so the script is the only input.
+            watch.watch(Path(__file__).resolve(), lambda spec: [], lambda spec, changed: spec.run(args))
+        else:
+            run(args)
+    finally:
+        cli.report_profile(args, "hk")
 
-(output_dir / "features.json").write_text(
-    json.dumps(features_collection, ensure_ascii=False, indent=2), encoding="utf-8"
-)
-(output_dir / "routes.json").write_text(
-    json.dumps(routes_collection, ensure_ascii=False, indent=2), encoding="utf-8"
-)
-(output_dir / "lines.json").write_text(
-    json.dumps(lines_meta, ensure_ascii=False, indent=2), encoding="utf-8"
-)
 
-print(
-    f"Wrote {len(features)} stations across {len(lines)} lines to {output_dir.relative_to(Path.cwd())}"
-)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import { DataFeatureCollection } from '@/lib/types'
+
+/**
+ * Loader for the per-line chunks written by the Python preprocessors with
+ * `--chunks`: `data/features/<line>.json` holds one line's stations as a
+ * compact FeatureCollection, and `data/features/index.json` lists every
+ * line's ID, chunk file, station count and byte size in line order.
+ *
+ * Cities without chunks fall back to filtering the full `features.json`, so
+ * callers can use `loadLineFeatures` for any city.
+ */
+
+export interface FeatureChunkIndex {
+  version: number
+  totalStations: number
+  lines: { id: string; file: string; count: number; bytes: number }[]
+}
+
+export const loadFeatureChunkIndex = async (
+  slug: string,
+): Promise<FeatureChunkIndex | null> => {
+  try {
+    const indexModule = await import(
+      `@/app/(game)/${slug}/data/features/index.json`
+    )
+    return indexModule.default as FeatureChunkIndex
+  } catch {
+    return null
+  }
+}
+
+export const loadLineFeatures = async (
+  slug: string,
+  lineIds?: string[],
+): Promise<DataFeatureCollection> => {
+  const wanted = lineIds ? new Set(lineIds) : null
+  const index = await loadFeatureChunkIndex(slug)
+
+  if (!index) {
+    const featuresModule = await import(
+      `@/app/(game)/${slug}/data/features.json`
+    )
+    const collection = featuresModule.default as DataFeatureCollection
+    if (!wanted) {
+      return collection
+    }
+    return {
+      ...collection,
+      features: collection.features.filter(
+        (feature) =>
+          !!feature.properties.line && wanted.has(feature.properties.line),
+      ),
+    }
+  }
+
+  // Chunk files are the percent-encoded line IDs. The literal `.json` suffix
+  // keeps the bundler's import context to the chunks themselves.
+  const chunks = await Promise.all(
+    index.lines
+      .filter((line) => !wanted || wanted.has(line.id))
+      .map(
+        (line) =>
+          import(
+            `@/app/(game)/${slug}/data/features/${encodeURIComponent(line.id)}.json`
+          ).then(
+            (chunkModule) => chunkModule.default as DataFeatureCollection,
+          ),
+      ),
+  )
+  return {
+    type: 'FeatureCollection',
+    features: chunks.flatMap((chunk) => chunk.features),
+  }
+}
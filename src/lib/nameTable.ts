@@ -0,0 +1,52 @@
+import { Feature } from 'geojson'
+import { DataFeatureCollection } from '@/lib/types'
+
+/**
+ * Expander for features.json files written with `--names table` by the Python
+ * preprocessors.
+ *
+ * Such collections carry `encoding: { alternateNames: 'table' }` and a
+ * top-level `alternateNames` array holding every distinct alternate-name list
+ * once. Each feature stores the index of its list in
+ * `properties.alternate_names_ref` instead of repeating the names, so an
+ * interchange served by several lines shares a single list. Expanded features
+ * share those arrays too; copy before mutating one.
+ */
+
+type DataFeatureProperties = DataFeatureCollection['features'][number]['properties']
+
+export interface NameTableFeatureCollection {
+  type: 'FeatureCollection'
+  encoding?: { alternateNames?: 'table' }
+  alternateNames?: string[][]
+  properties?: Record<string, unknown>
+  features: Feature<
+    DataFeatureCollection['features'][number]['geometry'],
+    Omit<DataFeatureProperties, 'alternate_names'> & {
+      alternate_names_ref?: number
+    }
+  >[]
+}
+
+export const expandAlternateNames = (
+  collection: NameTableFeatureCollection | DataFeatureCollection,
+): DataFeatureCollection => {
+  if (!('alternateNames' in collection) || !collection.alternateNames) {
+    return collection as DataFeatureCollection
+  }
+
+  const { alternateNames: table, encoding, ...rest } = collection
+  return {
+    ...rest,
+    features: collection.features.map((feature) => {
+      const { alternate_names_ref: ref, ...properties } = feature.properties
+      return {
+        ...feature,
+        properties:
+          ref === undefined
+            ? properties
+            : { ...properties, alternate_names: table[ref] },
+      }
+    }),
+  } as DataFeatureCollection
+}
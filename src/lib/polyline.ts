@@ -0,0 +1,89 @@
+import { Feature, LineString, MultiLineString } from 'geojson'
+import { RoutesFeatureCollection } from '@/lib/types'
+
+/**
+ * Decoder for routes.json files written with `--route-encoding polyline` by the
+ * Python preprocessors.
+ *
+ * Encoded collections carry `encoding: { geometry: 'polyline', precision }` and
+ * replace each LineString's `coordinates` with a `polyline` string. The string
+ * uses the Google encoded polyline algorithm: every vertex is stored in
+ * lat/lon order as the difference from the previous vertex, scaled by
+ * 10^precision, zigzag-encoded, split into 5-bit chunks (low bits first, 0x20
+ * set on all but the last chunk) and offset by 63 into printable ASCII.
+ */
+
+export interface EncodedLineString {
+  type: 'LineString'
+  polyline: string
+}
+
+export interface EncodedRoutesFeatureCollection {
+  type: 'FeatureCollection'
+  encoding?: { geometry: 'polyline'; precision: number }
+  properties?: RoutesFeatureCollection['properties']
+  features: Feature<
+    LineString | MultiLineString | EncodedLineString,
+    RoutesFeatureCollection['features'][number]['properties']
+  >[]
+}
+
+export const decodePolyline = (
+  encoded: string,
+  precision = 6,
+): [number, number][] => {
+  const factor = Math.pow(10, precision)
+  const coordinates: [number, number][] = []
+  let index = 0
+  let lat = 0
+  let lon = 0
+
+  // Plain arithmetic rather than 32-bit bitwise operators: at precision 7
+  // and above the scaled longitudes no longer fit in an int32.
+  const nextDelta = () => {
+    let result = 0
+    let scale = 1
+    let byte: number
+    do {
+      byte = encoded.charCodeAt(index++) - 63
+      result += (byte & 0x1f) * scale
+      scale *= 32
+    } while (byte >= 0x20)
+    return result % 2 === 1 ? -(result + 1) / 2 : result / 2
+  }
+
+  while (index < encoded.length) {
+    lat += nextDelta()
+    lon += nextDelta()
+    coordinates.push([lon / factor, lat / factor])
+  }
+
+  return coordinates
+}
+
+export const decodeRoutes = (
+  collection: EncodedRoutesFeatureCollection | RoutesFeatureCollection,
+): RoutesFeatureCollection => {
+  if (!('encoding' in collection) || !collection.encoding) {
+    return collection as RoutesFeatureCollection
+  }
+
+  const { precision } = collection.encoding
+  const { encoding, ...rest } = collection
+  return {
+    ...rest,
+    features: collection.features.map((feature) => {
+      const geometry = feature.geometry
+      if (!('polyline' in geometry)) {
+        return feature as RoutesFeatureCollection['features'][number]
+      }
+      return {
+        ...feature,
+        geometry: {
+          type: 'LineString',
+          coordinates: decodePolyline(geometry.polyline, precision),
+        },
+      }
+    }),
+  }
+}
@@ -0,0 +1,113 @@
+/**
+ * Reader for the `stations.bin` artifact written by the Python preprocessors
+ * with `--binary` (see `encode_binary` in `scripts/metro_data/output.py`).
+ *
+ * Layout, all integers little-endian:
+ *
+ * - Header, 40 bytes: magic `MMST`, then uint32 version, station count S,
+ *   line count L, route count R, route vertex count V, alternate-name count A,
+ *   string count N, string byte length B, reserved.
+ * - Float64: station coords [2S] (lon, lat), route coords [2V].
+ * - Uint32: string offsets [N + 1], station IDs [S], station name string [S],
+ *   alternate-name offsets [S + 1], alternate-name strings [A], line ID
+ *   strings [L], line station offsets [L + 1], route vertex offsets [R + 1].
+ * - Uint16: station line [S], route line [R].
+ * - UTF-8 string bytes [B].
+ *
+ * Stations are grouped by line: line `i` owns stations
+ * `lineOffsets[i]` to `lineOffsets[i + 1]`. Every section is a zero-copy
+ * typed-array view into the buffer; strings are decoded on demand.
+ */
+
+const MAGIC = 'MMST'
+const HEADER_BYTES = 40
+
+export interface StationBinary {
+  stationCoords: Float64Array
+  routeCoords: Float64Array
+  stationIds: Uint32Array
+  stationNames: Uint32Array
+  altOffsets: Uint32Array
+  altNames: Uint32Array
+  lineNames: Uint32Array
+  lineOffsets: Uint32Array
+  routeOffsets: Uint32Array
+  stationLines: Uint16Array
+  routeLines: Uint16Array
+  string: (index: number) => string
+}
+
+export const parseStationBinary = (buffer: ArrayBuffer): StationBinary => {
+  const view = new DataView(buffer)
+  const magic = String.fromCharCode(
+    ...new Uint8Array(buffer, 0, MAGIC.length),
+  )
+  if (magic !== MAGIC) {
+    throw new Error(`Not a stations.bin file (magic ${magic})`)
+  }
+  const header = (field: number) => view.getUint32(4 + field * 4, true)
+  const version = header(0)
+  if (version !== 1) {
+    throw new Error(`Unsupported stations.bin version ${version}`)
+  }
+  const [S, L, R, V, A, N, B] = [1, 2, 3, 4, 5, 6, 7].map(header)
+
+  let offset = HEADER_BYTES
+  const float64 = (length: number) => {
+    const array = new Float64Array(buffer, offset, length)
+    offset += length * 8
+    return array
+  }
+  const uint32 = (length: number) => {
+    const array = new Uint32Array(buffer, offset, length)
+    offset += length * 4
+    return array
+  }
+  const uint16 = (length: number) => {
+    const array = new Uint16Array(buffer, offset, length)
+    offset += length * 2
+    return array
+  }
+
+  const stationCoords = float64(S * 2)
+  const routeCoords = float64(V * 2)
+  const stringOffsets = uint32(N + 1)
+  const stationIds = uint32(S)
+  const stationNames = uint32(S)
+  const altOffsets = uint32(S + 1)
+  const altNames = uint32(A)
+  const lineNames = uint32(L)
+  const lineOffsets = uint32(L + 1)
+  const routeOffsets = uint32(R + 1)
+  const stationLines = uint16(S)
+  const routeLines = uint16(R)
+  const stringBytes = new Uint8Array(buffer, offset, B)
+
+  const decoder = new TextDecoder()
+  const cache = new Map<number, string>()
+  const string = (index: number) => {
+    let value = cache.get(index)
+    if (value === undefined) {
+      value = decoder.decode(
+        stringBytes.subarray(stringOffsets[index], stringOffsets[index + 1]),
+      )
+      cache.set(index, value)
+    }
+    return value
+  }
+
+  return {
+    stationCoords,
+    routeCoords,
+    stationIds,
+    stationNames,
+    altOffsets,
+    altNames,
+    lineNames,
+    lineOffsets,
+    routeOffsets,
+    stationLines,
+    routeLines,
+    string,
+  }
+}
@@ -22,8 +22,18 @@ export type RoutesFeatureCollection = FeatureCollection<
   LineString | MultiLineString,
   {
     color: string
+    // Written by the Python preprocessors: great-circle km along the route.
+    lengthKm?: number
+    meanSpacing?: number
+    cumDistance?: number[]
   }
->
+> & {
+  // Written by the Python preprocessors: network and per-line totals.
+  properties?: {
+    lengthKm: number
+    lines: { [line: string]: { lengthKm: number; meanSpacing: number } }
+  }
+}
 
 export type DataFeature = DataFeatureCollection['features'][number]
 